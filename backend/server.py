@@ -1,17 +1,32 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Tuple
 import uuid
-from uuid import uuid4
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse, unquote
+from itertools import islice
 import asyncio
+import bisect
+import gzip
+import hashlib
 import json
+import re
+import time
+import numpy as np
+
+from pymongo import ASCENDING, DeleteMany, IndexModel, ReplaceOne, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure, PyMongoError
+import httpx
 
 # OpenAI (async client)
 try:
@@ -19,12 +34,196 @@ try:
 except Exception:  # library may not be installed yet
     AsyncOpenAI = None  # type: ignore
 
+# XLSX catalog import
+try:
+    from openpyxl import load_workbook
+except Exception:  # library may not be installed yet
+    load_workbook = None  # type: ignore
+
+try:
+    import orjson
+except Exception:  # library may not be installed yet
+    orjson = None  # type: ignore
+
+try:
+    import brotli
+except Exception:  # library may not be installed yet
+    brotli = None  # type: ignore
+
+try:
+    # Reads PROMETHEUS_MULTIPROC_DIR at import; set it for multi-worker uvicorn
+    import prometheus_client
+    from prometheus_client import multiprocess
+except Exception:  # library may not be installed yet
+    prometheus_client = None  # type: ignore
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ------------------ Metrics ------------------
+# Seconds; mirrors the stage timing buckets
+METRIC_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+
+class _NoopMetric:
+    """Stands in for every metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, amount: float) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, doc: str, labels=(), **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, doc, list(labels), **kwargs)
+
+
+HTTP_REQUESTS = _metric("Counter", "kiosk_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = _metric("Histogram", "kiosk_http_request_duration_seconds", "HTTP request latency", ("method", "route"), buckets=METRIC_LATENCY_BUCKETS)
+STAGE_LATENCY = _metric("Histogram", "kiosk_stage_duration_seconds", "Latency of timed request stages", ("route", "stage"), buckets=METRIC_LATENCY_BUCKETS)
+LLM_CALLS = _metric("Counter", "kiosk_llm_calls_total", "Outbound LLM calls by outcome (ok, timeout, error, cancelled, empty, rejected)", ("provider", "model", "outcome"))
+LLM_LATENCY = _metric("Histogram", "kiosk_llm_call_duration_seconds", "Outbound LLM call latency, to the first token when streaming", ("provider", "model"), buckets=METRIC_LATENCY_BUCKETS)
+LLM_QUEUE_REJECTIONS = _metric("Counter", "kiosk_llm_queue_rejections_total", "LLM calls refused by the concurrency limiter", ("provider",))
+LLM_IN_FLIGHT = _metric("Gauge", "kiosk_llm_in_flight", "LLM calls holding a concurrency limiter slot", ("limiter",), multiprocess_mode="livesum")
+LLM_QUEUE_DEPTH = _metric("Gauge", "kiosk_llm_queue_depth", "LLM calls waiting for a concurrency limiter slot", ("limiter",), multiprocess_mode="livesum")
+LLM_QUEUE_WAIT = _metric("Histogram", "kiosk_llm_queue_wait_seconds", "Time an LLM call waited for a concurrency limiter slot", ("limiter",), buckets=METRIC_LATENCY_BUCKETS)
+LLM_FALLBACKS = _metric("Counter", "kiosk_llm_fallbacks_total", "Answers served without any LLM (rules or canned fallback)", ("feature",))
+CACHE_LOOKUPS = _metric("Counter", "kiosk_cache_lookups_total", "Cache lookups by cache and result (hit, miss)", ("cache", "result"))
+MONGO_LATENCY = _metric("Histogram", "kiosk_mongo_command_duration_seconds", "MongoDB command latency", ("command", "collection"), buckets=METRIC_LATENCY_BUCKETS)
+MONGO_ERRORS = _metric("Counter", "kiosk_mongo_command_errors_total", "Failed MongoDB commands", ("command", "collection"))
+LOOP_LAG = _metric("Histogram", "kiosk_event_loop_lag_seconds", "Event loop scheduling delay", buckets=METRIC_LATENCY_BUCKETS)
+LOOP_LAG_LAST = _metric("Gauge", "kiosk_event_loop_lag_last_seconds", "Most recent event loop lag sample", multiprocess_mode="max")
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def llm_call_metrics(provider: str, model: str):
+    """Count and time one outbound LLM call by how it ended."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except asyncio.CancelledError:
+        # e.g. the losing model of a hedged vibe request
+        outcome = "cancelled"
+        raise
+    except StopAsyncIteration:
+        outcome = "empty"
+        raise
+    except LLMQueueFull:
+        outcome = "rejected"
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        LLM_CALLS.labels(provider, model, outcome).inc()
+        LLM_LATENCY.labels(provider, model).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding the Mongo latency histogram.
+
+    Runs on motor's worker threads; the collection name is only present on
+    the started event, so it is kept per request id until the reply.
+    """
+
+    COMMANDS = {"find", "getMore", "insert", "update", "delete", "findAndModify", "aggregate", "count", "distinct", "createIndexes", "collMod"}
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event) -> None:
+        if event.command_name in self.COMMANDS:
+            collection = event.command.get(event.command_name)
+            self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event, failed: bool) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        if failed:
+            MONGO_ERRORS.labels(event.command_name, collection).inc()
+
+    def succeeded(self, event) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._finish(event, failed=True)
+
+
+async def event_loop_lag_monitor() -> None:
+    """Sample how late the loop wakes a sleeping task; blocking code shows up here."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - started - EVENT_LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request under its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route on the scope; templates keep label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], path, str(status)).inc()
+            HTTP_LATENCY.labels(scope["method"], path).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> bytes:
+    if METRICS_MULTIPROC_DIR:
+        # Sum the per-worker files so any worker can answer for the whole process group
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+
+mongo_command_metrics = MongoCommandMetrics()
+_loop_lag_task: Optional[asyncio.Task] = None
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_metrics])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app and router (all backend routes must be under /api)
@@ -42,6 +241,8 @@ class Product(BaseModel):
     style_tags: List[str] = []
     occasion_tags: List[str] = []
     description: Optional[str] = None
+    category: Optional[str] = None
+    metal_types: List[str] = []
 
 class SurveyInput(BaseModel):
     occasion: str
@@ -226,6 +427,7 @@ async def seed_products_if_needed():
         base["name"] = base["name"] + f" Variant {i+1}"
         more.append(base)
     await db.products.insert_many(sample + more)
+    await bump_catalog_version()
 
 
 def match_vibe(s: SurveyInput) -> str:
@@ -267,1216 +469,1644 @@ def vibe_explanation(vibe: str) -> str:
     }
     return explanations.get(vibe, "Personalized selections tuned to your style and occasion.")
 
-# ------------------ OpenAI integration ------------------
-async def get_ai_vibe(payload: AIRequest) -> Optional[AIResponse]:
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key or AsyncOpenAI is None:
+# ------------------ Shared LLM clients ------------------
+# One client per provider for the life of the worker, so every survey and chat
+# turn reuses pooled keep-alive connections instead of a fresh TLS handshake.
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", "50"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+
+LLM_PROVIDERS: Dict[str, Dict[str, Optional[str]]] = {
+    "openai": {"key_env": "OPENAI_API_KEY", "base_url": None},
+    "xai": {"key_env": "XAI_API_KEY", "base_url": "https://api.x.ai/v1"},
+    "groq": {"key_env": "GROQ_API_KEY", "base_url": None},
+}
+
+_llm_clients: Dict[str, Any] = {}
+
+
+def build_llm_http_client() -> httpx.AsyncClient:
+    http2 = LLM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logging.warning("LLM_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
+
+def get_llm_client(provider: str) -> Optional[Any]:
+    """Return the shared client for a provider, or None if it is not configured."""
+    if provider in _llm_clients:
+        return _llm_clients[provider]
+    conf = LLM_PROVIDERS[provider]
+    api_key = os.environ.get(conf["key_env"])
+    if not api_key:
         return None
+    if provider == "groq":
+        from groq import AsyncGroq
+        llm = AsyncGroq(api_key=api_key, http_client=build_llm_http_client())
+    else:
+        if AsyncOpenAI is None:
+            return None
+        llm = AsyncOpenAI(api_key=api_key, base_url=conf["base_url"], http_client=build_llm_http_client())
+    _llm_clients[provider] = llm
+    return llm
+
+
+def init_llm_clients() -> None:
+    for provider in LLM_PROVIDERS:
+        try:
+            get_llm_client(provider)
+        except Exception as e:
+            logging.warning(f"Could not create {provider} client: {e}")
+
+
+async def close_llm_clients() -> None:
+    for llm in list(_llm_clients.values()):
+        try:
+            await llm.close()
+        except Exception as e:
+            logging.warning(f"Error closing LLM client: {e}")
+    _llm_clients.clear()
+
+# ------------------ LLM concurrency limits ------------------
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "64"))
+LLM_PROVIDER_CONCURRENCY = int(os.environ.get("LLM_PROVIDER_CONCURRENCY", "16"))
+LLM_QUEUE_MAX = int(os.environ.get("LLM_QUEUE_MAX", "100"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "2.0"))
+
+
+class LLMQueueFull(Exception):
+    """No LLM call slot became free in time; callers answer from their fallback."""
+
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded wait queue and wait-time counters."""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self._sem = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def acquire(self, timeout: float) -> None:
+        started = time.monotonic()
+        if self._sem.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LLMQueueFull(f"{self.name} queue is full ({self.waiting} waiting)")
+            self.waiting += 1
+            LLM_QUEUE_DEPTH.labels(self.name).set(self.waiting)
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise LLMQueueFull(f"{self.name} queue wait exceeded {LLM_QUEUE_TIMEOUT}s")
+            finally:
+                self.waiting -= 1
+                LLM_QUEUE_DEPTH.labels(self.name).set(self.waiting)
+        else:
+            # A free slot is taken without suspending
+            await self._sem.acquire()
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.in_flight += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        LLM_IN_FLIGHT.labels(self.name).set(self.in_flight)
+        LLM_QUEUE_WAIT.labels(self.name).observe(waited)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._sem.release()
+        LLM_IN_FLIGHT.labels(self.name).set(self.in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "queue_max": self.max_queue,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+llm_global_limiter = ConcurrencyLimiter("global", LLM_MAX_CONCURRENCY, LLM_QUEUE_MAX)
+llm_provider_limiters: Dict[str, ConcurrencyLimiter] = {
+    name: ConcurrencyLimiter(
+        name,
+        int(os.environ.get(f"LLM_CONCURRENCY_{name.upper()}", LLM_PROVIDER_CONCURRENCY)),
+        LLM_QUEUE_MAX,
+    )
+    for name in ("openai", "xai", "groq", "emergent")
+}
+
+
+@asynccontextmanager
+async def llm_slot(provider: str):
+    """Hold a provider slot and a global slot for one outbound LLM call.
+
+    The provider slot is taken first so a call queued on a busy provider does
+    not sit on a global slot. Raises LLMQueueFull after LLM_QUEUE_TIMEOUT.
+    """
+    deadline = time.monotonic() + LLM_QUEUE_TIMEOUT
+    held: List[ConcurrencyLimiter] = []
     try:
-        client = AsyncOpenAI(api_key=api_key)
-        prefer = os.environ.get("OPENAI_MODEL", "gpt-4o-mini").strip()
-        fallbacks = [m for m in [prefer, "gpt-4o", "gpt-4.1", "gpt-4o-mini"] if m]
-        system = (
-            "You are a luxury jewelry stylist. Given the survey, return JSON only with keys 'vibe' and 'explanation'. "
-            "Vibe must be EXACTLY one of: [Hollywood Glam, Editorial Chic, Bridal Grace, Everyday Chic, Minimal Modern, Vintage Romance, Boho Luxe, Bold Statement]."
-        )
-        user = (
-            f"Occasion: {payload.occasion}\n"
-            f"Style: {payload.style}\n"
-            f"Budget: {payload.budget}\n"
-            f"Preference: {payload.vibe_preference or 'None'}"
-        )
-        last_err = None
-        for model in fallbacks:
+        for limiter in (llm_provider_limiters[provider], llm_global_limiter):
             try:
-                supports_json_mode = any(x in model for x in ["gpt-4o", "gpt-4.1", "gpt-5", "o4", "mini"])
-                kwargs = dict(model=model, messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ], temperature=0.4, max_tokens=220)
-                if supports_json_mode:
-                    kwargs["response_format"] = {"type": "json_object"}
-                resp = await asyncio.wait_for(
-                    client.chat.completions.create(**kwargs),
-                    timeout=22.0,
-                )
-                content = resp.choices[0].message.content or ""
-                data = None
-                try:
-                    data = json.loads(content)
-                except Exception:
-                    import re
-                    m = re.search(r"\{[\s\S]*\}", content)
-                    if m:
-                        try:
-                            data = json.loads(m.group(0))
-                        except Exception:
-                            data = None
-                if not isinstance(data, dict):
-                    vibe_guess = match_vibe(SurveyInput(**payload.model_dump()))
-                    return AIResponse(vibe=vibe_guess, explanation="Tailored to your inputs.", source="ai")
-                vibe = data.get("vibe")
-                explanation = data.get("explanation")
-                if isinstance(vibe, str) and isinstance(explanation, str) and vibe in VIBE_IMAGES:
-                    return AIResponse(vibe=vibe, explanation=explanation, source="ai")
-            except Exception as ie:
-                last_err = ie
-                continue
-        if last_err:
-            raise last_err
-    except Exception as e:
-        logging.warning(f"OpenAI vibe failed, fallback to rules. Error: {e}")
-    return None
+                await limiter.acquire(deadline - time.monotonic())
+            except LLMQueueFull:
+                LLM_QUEUE_REJECTIONS.labels(provider).inc()
+                raise
+            held.append(limiter)
+        yield
+    finally:
+        for limiter in reversed(held):
+            limiter.release()
 
-async def recommend_products(s: SurveyInput, vibe: str) -> List[RecommendationItem]:
-    # Compare budgets in INR using USD price converted
-    min_inr, max_inr = BUDGET_RANGES_INR.get(s.budget, (0, 10**12))
+# ------------------ Vibe cache ------------------
+class TTLCache:
+    """Size-bounded LRU cache with a per-entry TTL and hit/miss counters."""
 
-    style_q = s.style.lower().split()
-    occ_q = s.occasion.lower().split()
+    def __init__(self, max_entries: int, ttl: float, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name  # label for the cache lookup metric
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-    cursor = db.products.find({})
-    items = await cursor.to_list(1000)
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            if self.name:
+                record_cache_lookup(self.name, False)
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        if self.name:
+            record_cache_lookup(self.name, True)
+        return entry[1]
 
-    scored: List[tuple[float, Dict[str, Any]]] = []
-    for it in items:
-        price_usd = float(it.get("price", 0))
-        price_inr = price_usd * USD_TO_INR
-        if not (min_inr <= price_inr <= max_inr):
-            continue
-        score = 0.0
-        tags = [t.lower() for t in it.get("style_tags", [])]
-        occs = [t.lower() for t in it.get("occasion_tags", [])]
-        score += sum(1 for t in tags for q in style_q if q in t) * 1.5
-        score += sum(1 for t in occs for q in occ_q if q in t) * 1.2
-        if vibe.split()[0].lower() in tags:
-            score += 1.0
-        # bias towards mid INR price range
-        score += 0.2 if 8000 <= price_inr <= 65000 else 0
-        scored.append((score, it))
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = [x[1] for x in scored[:4]]
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
 
-    recs: List[RecommendationItem] = []
-    for it in top:
-        price_usd = float(it.get("price", 0))
-        price_inr = int(round(price_usd * USD_TO_INR))
-        reason_bits = []
-        if any(k in (s.style.lower()) for k in it.get("style_tags", [])):
-            reason_bits.append("matches your style preference")
-        if any(k in (s.occasion.lower()) for k in it.get("occasion_tags", [])):
-            reason_bits.append("perfect for your occasion")
-        reason_bits.append(f"within your budget at {format_inr(price_inr)}")
-        reason = ", ".join(reason_bits) if reason_bits else "tailored to your inputs"
-        recs.append(RecommendationItem(product=Product(**it), reason=reason))
-    if len(recs) < 3:
-        for it in items:
-            price_usd = float(it.get("price", 0))
-            price_inr = int(round(price_usd * USD_TO_INR))
-            if min_inr <= price_inr <= max_inr and all(r.product.id != it["id"] for r in recs):
-                recs.append(RecommendationItem(product=Product(**it), reason=f"great fit for your budget at {format_inr(price_inr)}"))
-            if len(recs) >= 4:
-                break
-    return recs
 
-# -------------------------------------------------
-# Routes
-# -------------------------------------------------
-@api.get("/health")
-async def health():
-    return {"ok": True, "time": now_iso()}
+class SingleFlight:
+    """Coalesces concurrent calls that share a key onto one in-flight task.
 
-@api.get("/")
-async def root():
-    return {"message": "Evol Jewels AI Stylist API"}
+    The task is shielded, so a caller that goes away does not cancel the work
+    the other waiters depend on.
+    """
 
-@api.get("/products", response_model=List[Product])
-async def list_products():
-    items = await db.products.find({}).to_list(1000)
-    return [Product(**it) for it in items]
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
 
-@api.post("/ai/vibe", response_model=AIResponse)
-async def ai_vibe(payload: AIRequest):
-    ai = await get_ai_vibe(payload)
-    if ai:
-        return ai
-    vibe = match_vibe(SurveyInput(**payload.model_dump()))
-    return AIResponse(vibe=vibe, explanation=vibe_explanation(vibe), source="rules")
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
 
-@api.post("/survey", response_model=RecommendationResponse)
-async def submit_survey(payload: SurveyInput):
-    ai = await get_ai_vibe(AIRequest(**payload.model_dump()))
-    if ai:
-        vibe = ai.vibe
-        explanation = ai.explanation
-        engine = "ai"
-    else:
-        vibe = match_vibe(payload)
-        explanation = vibe_explanation(vibe)
-        engine = "rules"
-    mood_img = VIBE_IMAGES.get(vibe)
-    # Get enhanced recommendations using real Evol Jewels data
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+VIBE_CACHE_TTL = float(os.environ.get("VIBE_CACHE_TTL_SECONDS", "21600"))
+VIBE_CACHE_MAX_ENTRIES = int(os.environ.get("VIBE_CACHE_MAX_ENTRIES", "4096"))
+# Optional Mongo-backed tier shared by all workers and kiosks
+VIBE_CACHE_SHARED = os.environ.get("VIBE_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+
+vibe_cache = TTLCache(VIBE_CACHE_MAX_ENTRIES, VIBE_CACHE_TTL, name="vibe_local")
+vibe_cache_shared_stats = {"hits": 0, "misses": 0, "errors": 0}
+vibe_flights = SingleFlight()
+
+
+def vibe_cache_key(payload: AIRequest) -> str:
+    """Case- and whitespace-insensitive key over the survey fields the LLM sees."""
+    fields = (payload.occasion, payload.style, payload.budget, payload.vibe_preference or "")
+    return "|".join(" ".join(f.lower().split()) for f in fields)
+
+
+async def get_shared_vibe(key: str) -> Optional[AIResponse]:
     try:
-        recs = await get_enhanced_recommendations(payload.model_dump())
-        if not recs:
-            # Fallback to existing logic
-            recs = await recommend_products(payload, vibe)
+        doc = await db.vibe_cache.find_one({"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
     except Exception as e:
-        logger.error(f"Enhanced recommendation error: {e}")
-        # Fallback to existing logic
-        recs = await recommend_products(payload, vibe)
+        vibe_cache_shared_stats["errors"] += 1
+        logging.warning(f"Shared vibe cache read failed: {e}")
+        return None
+    if not doc:
+        vibe_cache_shared_stats["misses"] += 1
+        record_cache_lookup("vibe_shared", False)
+        return None
+    vibe_cache_shared_stats["hits"] += 1
+    record_cache_lookup("vibe_shared", True)
+    return AIResponse(vibe=doc["vibe"], explanation=doc["explanation"], source=doc["source"])
 
-    session_id = str(uuid.uuid4())
-    created_at = now_iso()
-    await db.sessions.insert_one({
-        "id": session_id,
-        "created_at": created_at,
-        "survey": payload.model_dump(),
-        "vibe": vibe,
-        "explanation": explanation,
-        "engine": engine,
-        "recommendation_product_ids": [r.product.id for r in recs],
-    })
-
-    return RecommendationResponse(
-        session_id=session_id,
-        engine=engine,
-        vibe=vibe,
-        explanation=explanation,
-        moodboard_image=mood_img,
-        recommendations=recs,
-        created_at=created_at,
-    )
 
-@api.get("/passport/{session_id}", response_model=PassportResponse)
-async def get_passport(session_id: str):
-    sess = await db.sessions.find_one({"id": session_id})
-    if not sess:
-        raise HTTPException(status_code=404, detail="Session not found")
-    prod_ids = sess.get("recommendation_product_ids", [])
-    prods = await db.products.find({"id": {"$in": prod_ids}}).to_list(200)
-    recs: List[RecommendationItem] = []
-    for it in prods:
-        price_usd = float(it.get("price", 0))
-        price_inr = int(round(price_usd * USD_TO_INR))
-        recs.append(RecommendationItem(product=Product(**it), reason=f"curated for your vibe at {format_inr(price_inr)}"))
+async def put_shared_vibe(key: str, ai: AIResponse) -> None:
+    try:
+        await db.vibe_cache.update_one(
+            {"key": key},
+            {"$set": {**ai.model_dump(), "key": key, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=VIBE_CACHE_TTL)}},
+            upsert=True,
+        )
+    except Exception as e:
+        vibe_cache_shared_stats["errors"] += 1
+        logging.warning(f"Shared vibe cache write failed: {e}")
 
-    survey = SurveyInput(**sess["survey"]) if isinstance(sess.get("survey"), dict) else SurveyInput(**{})
-    engine = sess.get("engine", "rules")
-    return PassportResponse(
-        session_id=sess["id"],
-        engine=engine,
-        survey=survey,
-        vibe=sess.get("vibe", ""),
-        explanation=sess.get("explanation", ""),
-        recommendations=recs,
-        created_at=sess.get("created_at", now_iso()),
-    )
 
-# Register router
-app.include_router(api)
+async def get_ai_vibe(payload: AIRequest) -> Tuple[Optional[AIResponse], str]:
+    """Cached front for the LLM vibe call; only successful AI answers are cached.
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    Returns (answer, tier) where tier names what answered: "table",
+    "local", "shared" or "llm". The answer is None when the LLM was tried
+    and gave nothing usable.
+    """
+    key = vibe_cache_key(payload)
+    # Known survey options are answered from the precomputed table
+    ai = vibe_table.get(key)
+    if ai is not None:
+        vibe_table_stats["hits"] += 1
+        record_cache_lookup("vibe_table", True)
+        return ai, "table"
+    vibe_table_stats["misses"] += 1
+    record_cache_lookup("vibe_table", False)
+    ai = vibe_cache.get(key)
+    if ai is not None:
+        return ai, "local"
 
-# Logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+    async def load() -> Tuple[Optional[AIResponse], str]:
+        if VIBE_CACHE_SHARED:
+            shared = await get_shared_vibe(key)
+            if shared is not None:
+                vibe_cache.set(key, shared)
+                return shared, "shared"
+        fresh = await fetch_ai_vibe(payload)
+        if fresh is not None:
+            vibe_cache.set(key, fresh)
+            if VIBE_CACHE_SHARED:
+                await put_shared_vibe(key, fresh)
+        return fresh, "llm"
 
-# Real Evol Jewels Product Data
+    # Identical surveys arriving together share one lookup and LLM call
+    return await vibe_flights.do(key, load)
 
-EVOL_PRODUCTS = [
-    {
-        "id": str(uuid4()),
-        "name": "Talia Diamond Ring",
-        "price": 14998,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332381-RG-PV_3024x.jpg?v=1711002550",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332381-RG-T2V_3024x.jpg?v=1711002550",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/talia-diamond-ring",
-        "description": "Talia Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic'],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Orbis Diamond Ring",
-        "price": 15323,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/SRNG570647__06_3024x.webp?v=1734329931",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/SRNG570647__05_3024x.webp?v=1734329931",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/orbis-diamond-ring",
-        "description": "Orbis Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic'],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Hold Me Closer Diamond Ring",
-        "price": 21153,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-51407-M-20-YG-PV_3024x.png?v=1715927703",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-51407-M-20-YG-T2V_3024x.png?v=1715927703",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/hold-me-closer-diamond-ring",
-        "description": "Hold Me Closer Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Dazzling Dewdrop Diamond Studs",
-        "price": 22319,
-        "category": "Earrings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51821-Lot5-S17-YG-PV_3024x.png?v=1721109858",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51821-Lot5-S17-YG-TV_3024x.png?v=1721109858",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/dazzling-dewdrop-diamond-studs",
-        "description": "Dazzling Dewdrop Diamond Studs - Evol Jewels",
-        "occasion": ['Everyday', 'Work'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Wain Marquise Diamond Ring",
-        "price": 22699,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG333668-WG-PV_3024x.jpg?v=1680196025",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG333668-WG-T2V_3024x.jpg?v=1680196025",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/wain-marquise-diamond-ring",
-        "description": "Wain Marquise Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "First-Crush Diamond Necklace",
-        "price": 23685,
-        "category": "Necklaces",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['16 inch', '18 inch', '20 inch'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-OTH-R-31347-PT60314-YG-PV_3024x.jpg?v=1753343172",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-OTH-R-31347-PT60314-YG-FV_3024x.jpg?v=1753343172",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/first-crush-diamond-necklace",
-        "description": "First-Crush Diamond Necklace - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Romance Diamond Ring",
-        "price": 25463,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-51850-CST-1914-RN-SMP-PD-3478-YG-PV_3024x.png?v=1718012376",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-51850-CST-1914-RN-SMP-PD-3478-YG-TV_3024x.png?v=1718012375",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/love-you-ring",
-        "description": "Romance Diamond Ring - Evol Jewels",
-        "occasion": ['Romantic'],
-        "style": ['Vintage'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Nova diamond eternity ring",
-        "price": 25237,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46473-ER-11-YG-PV_3024x.jpg?v=1709798343",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46473-ER-11-YG-FV_3024x.jpg?v=1709798343",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/nova-diamond-eternity-ring",
-        "description": "Nova diamond eternity ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Tranquil Diamond Necklace",
-        "price": 26644,
-        "category": "Necklaces",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['16 inch', '18 inch', '20 inch'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-OTH-R-31339-NK60271-RG-PV_3024x.jpg?v=1695635936",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-OTH-R-31339-NK60271-RG-FV_3024x.jpg?v=1695635936",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/tranquil-diamond-necklace",
-        "description": "Tranquil Diamond Necklace - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
+# ------------------ OpenAI integration ------------------
+VIBE_MODEL_TIMEOUT = float(os.environ.get("VIBE_MODEL_TIMEOUT", "22"))
+# After this many seconds the survey stops waiting and match_vibe answers
+VIBE_DEADLINE = float(os.environ.get("VIBE_DEADLINE_SECONDS", "12"))
+# Hedging starts the next fallback model when the current one is slower than
+# the recent p95, instead of waiting for it to time out
+VIBE_HEDGE = os.environ.get("VIBE_HEDGE", "true").lower() in ("1", "true", "yes")
+VIBE_HEDGE_DELAY = float(os.environ.get("VIBE_HEDGE_DELAY", "3"))
+VIBE_HEDGE_MIN_DELAY = float(os.environ.get("VIBE_HEDGE_MIN_DELAY", "0.5"))
+VIBE_HEDGE_MIN_SAMPLES = 20
+
+vibe_latencies: "deque[float]" = deque(maxlen=200)
+
+
+def vibe_hedge_delay() -> float:
+    """p95 of recent successful vibe calls, or the configured delay until enough samples exist."""
+    if len(vibe_latencies) < VIBE_HEDGE_MIN_SAMPLES:
+        return VIBE_HEDGE_DELAY
+    ordered = sorted(vibe_latencies)
+    return max(VIBE_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+
+async def vibe_from_model(client: Any, model: str, system: str, user: str) -> Optional[AIResponse]:
+    """Ask one model for a vibe. Returns None when the answer is not JSON or names an unknown vibe."""
+    supports_json_mode = any(x in model for x in ["gpt-4o", "gpt-4.1", "gpt-5", "o4", "mini"])
+    kwargs = dict(model=model, messages=[
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ], temperature=0.4, max_tokens=220)
+    if supports_json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+    async with llm_slot("openai"):
+        started = time.monotonic()
+        try:
+            with llm_call_metrics("openai", model):
+                resp = await asyncio.wait_for(
+                    client.chat.completions.create(**kwargs),
+                    timeout=VIBE_MODEL_TIMEOUT,
+                )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # Hedged losers and timeouts were at least this slow; leaving them
+            # out would drag the hedge delay down toward its minimum
+            vibe_latencies.append(time.monotonic() - started)
+            raise
+        vibe_latencies.append(time.monotonic() - started)
+    content = resp.choices[0].message.content or ""
+    data = None
+    try:
+        data = json.loads(content)
+    except Exception:
+        m = re.search(r"\{[\s\S]*\}", content)
+        if m:
+            try:
+                data = json.loads(m.group(0))
+            except Exception:
+                data = None
+    if not isinstance(data, dict):
+        # Unreadable output is a failed attempt, so no rules guess gets cached as an AI answer
+        return None
+    vibe = data.get("vibe")
+    explanation = data.get("explanation")
+    if isinstance(vibe, str) and isinstance(explanation, str) and vibe in VIBE_IMAGES:
+        return AIResponse(vibe=vibe, explanation=explanation, source="ai")
+    return None
+
+
+async def fetch_ai_vibe(payload: AIRequest, hedge: bool = True) -> Optional[AIResponse]:
+    client = get_llm_client("openai")
+    if client is None:
+        return None
+    prefer = os.environ.get("OPENAI_MODEL", "gpt-4o-mini").strip()
+    fallbacks = list(dict.fromkeys(m for m in [prefer, "gpt-4o", "gpt-4.1", "gpt-4o-mini"] if m))
+    system = (
+        "You are a luxury jewelry stylist. Given the survey, return JSON only with keys 'vibe' and 'explanation'. "
+        "Vibe must be EXACTLY one of: [Hollywood Glam, Editorial Chic, Bridal Grace, Everyday Chic, Minimal Modern, Vintage Romance, Boho Luxe, Bold Statement]."
+    )
+    user = (
+        f"Occasion: {payload.occasion}\n"
+        f"Style: {payload.style}\n"
+        f"Budget: {payload.budget}\n"
+        f"Preference: {payload.vibe_preference or 'None'}"
+    )
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + VIBE_DEADLINE
+    hedge_delay = vibe_hedge_delay() if VIBE_HEDGE and hedge else None
+    pending: set = set()
+    next_model = 0
+    last_err: Optional[BaseException] = None
+
+    def launch_next() -> None:
+        nonlocal next_model
+        if next_model < len(fallbacks):
+            model = fallbacks[next_model]
+            next_model += 1
+            pending.add(asyncio.ensure_future(vibe_from_model(client, model, system, user)))
+
+    launch_next()
+    try:
+        while pending:
+            wait = deadline - loop.time()
+            if wait <= 0:
+                logging.warning(f"OpenAI vibe missed the {VIBE_DEADLINE}s deadline, fallback to rules")
+                return None
+            if hedge_delay is not None and next_model < len(fallbacks):
+                wait = min(wait, hedge_delay)
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if isinstance(task.exception(), LLMQueueFull):
+                    logging.warning(f"OpenAI vibe skipped, fallback to rules: {task.exception()}")
+                    return None
+                if task.exception() is not None:
+                    last_err = task.exception()
+                elif task.result() is not None:
+                    return task.result()
+            # A model that failed is replaced right away; a slow one gets a hedge
+            if done or hedge_delay is not None:
+                launch_next()
+    finally:
+        for task in pending:
+            task.cancel()
+    if last_err:
+        logging.warning(f"OpenAI vibe failed, fallback to rules. Error: {last_err}")
+    return None
+
+# ------------------ Vibe table warm-up ------------------
+# Option sets of each survey screen, with the budget labels that screen sends
+KIOSK_BUDGETS = ["₹10,000 - ₹60,000", "₹60,000 - ₹1,00,000", "₹1,00,000 - ₹2,00,000", "₹2,00,000 - ₹4,00,000"]
+LEGACY_BUDGETS = ["Under ₹8,000", "₹8,000–₹25,000", "₹25,000–₹65,000", "₹65,000+"]
+SURVEY_OPTION_SETS: List[Dict[str, List[str]]] = [
+    # StylePreferencePage.jsx / OccasionPage.jsx / BudgetRangePage.jsx (kiosk flow)
     {
-        "id": str(uuid4()),
-        "name": "Lineal Diamond Chain Bracelet",
-        "price": 26610,
-        "category": "Bracelets",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['6.7"'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SBRC317623-RG-PV_3024x.jpg?v=1680170804",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SBRC317623-RG-T2V_3024x.jpg?v=1694434404",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/lineal-diamond-chain-bracelet",
-        "description": "Lineal Diamond Chain Bracelet - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
+        "occasions": ["Everyday", "Special Events", "Work", "Romantic"],
+        "styles": ["Classic", "Modern", "Vintage", "Bohemian"],
+        "budgets": KIOSK_BUDGETS,
     },
+    # pages/SurveyScreen.jsx
     {
-        "id": str(uuid4()),
-        "name": "Butterfly Diamond Studs",
-        "price": 26668,
-        "category": "Earrings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN327984-YG-TV_3024x.jpg?v=1680152913",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN327984-YG-PV_3024x.jpg?v=1755327462",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/butterfly-diamond-studs",
-        "description": "Butterfly Diamond Studs",
-        "occasion": ['Everyday', 'Work'],
-        "style": ['Bohemian'],
-        "celebrity_vibe": "Boho Luxe"
+        "occasions": ["Everyday", "Special Events", "Work", "Romantic"],
+        "styles": ["Classic", "Modern", "Vintage", "Bohemian"],
+        "budgets": LEGACY_BUDGETS,
     },
+    # ChatInline chips and the survey form in App.js (the form offers a subset of these styles)
     {
-        "id": str(uuid4()),
-        "name": "Duri Diamond Ring",
-        "price": 26440,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332405-YG-PV_3024x.jpg?v=1680164750",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332405-YG-T2V_3024x.jpg?v=1715849392",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/duri-damond-ring",
-        "description": "Duri Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
+        "occasions": ["Wedding", "Red Carpet", "Everyday", "Office", "Party", "Festival", "Date Night"],
+        "styles": ["Minimal", "Bold", "Glam", "Editorial", "Vintage", "Boho", "Classic", "Modern", "Chic"],
+        "budgets": LEGACY_BUDGETS,
     },
-    {
-        "id": str(uuid4()),
-        "name": "Astra Diamond Earrings",
-        "price": 29219,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27550-E04-RG-PV_3024x.jpg?v=1694198438",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27550-E04-RG-FV_3024x.jpg?v=1694198438",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/astra-diamond-earrings",
-        "description": "Astra Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Zeal Diamond Bracelet",
-        "price": 29523,
-        "category": "Bracelets",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-27546-B04-YG-PV_3024x.jpg?v=1692680527",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-27546-B04-YG-T2V_3024x.jpg?v=1694435994",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/zeal-diamond-bracelet",
-        "description": "Zeal Diamond Bracelet - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Galaxy diamond eternity ring",
-        "price": 28921,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46471-ER-9-YG-PV_3024x.jpg?v=1709793988",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46471-ER-9-YG-FV_3024x.jpg?v=1709793988",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/galaxy-diamond-eternity",
-        "description": "Galaxy diamond eternity ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Ornate Star Diamond Earrings",
-        "price": 30087,
-        "category": "Rings",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51823-Lot5-S21-WG-PV_3024x.png?v=1719569654",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51823-Lot5-S21-WG-TV_3024x.png?v=1719569654",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/ornate-star-diamond-earrings",
-        "description": "Ornate Star Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Cupid Diamond Earrings",
-        "price": 30496,
-        "category": "Rings",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47053-V5-WG-PV_3024x.jpg?v=1709989559",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47053-V5-WG-TV_3024x.jpg?v=1709989559",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/cupid-diamond-earrings",
-        "description": "Cupid Diamond Earrings - Evol Jewels",
-        "occasion": ['Romantic'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Bubble diamond ring",
-        "price": 30304,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46456-E-22-YG-PV_3024x.jpg?v=1710309630",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46456-E-22-YG-FV_3024x.jpg?v=1710309630",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/bubble-diamond-ring",
-        "description": "Bubble diamond ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Zen diamond eternity ring",
-        "price": 30469,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46475-ER-15-YG-PV_3024x.jpg?v=1709883074",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46475-ER-15-YG-FV_3024x.jpg?v=1709883074",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/zen-diamond-eternity-ring",
-        "description": "Zen diamond eternity ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Selene Diamond Earrings",
-        "price": 31320,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27553-E09-YG-PV_3024x.jpg?v=1695300631",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27553-E09-YG-FV_3024x.jpg?v=1695300795",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/selene-diamond-earrings",
-        "description": "Selene Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Mirage diamond Earrings",
-        "price": 31700,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27547-E01-RG-FV_3024x.jpg?v=1692796472",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27547-E01-RG-TV_3024x.jpg?v=1694520597",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/mirage-diamond-earrings",
-        "description": "Mirage diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Floret Diamond Stud Earrings",
-        "price": 31446,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN332425-RG-TV_3024x.jpg?v=1755324762",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN332425-RG-FV_3024x.jpg?v=1755324766",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/floret-diamond-stud-earrings",
-        "description": "Floret Diamond Stud Earrings",
-        "occasion": ['Everyday', 'Work'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Serpent's Tail Diamond Ring",
-        "price": 31950,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332407-YG-PV_3024x.jpg?v=1755327297",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332407-YG-T2V_3024x.jpg?v=1694435186",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/serpents-tail-diamond-ring",
-        "description": "Serpent's Tail Diamond Ring",
-        "occasion": ['Special Events'],
-        "style": ['Vintage'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Stardust Diamond Bracelet",
-        "price": 32892,
-        "category": "Bracelets",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-27545-B02-RG-PV_3024x.jpg?v=1692613512",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-27545-B02-RG-T2V_3024x.jpg?v=1692613512",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/stardust-diamond-bracelet",
-        "description": "Stardust Diamond Bracelet - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Hope Diamond Eternity Ring",
-        "price": 32289,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332409-YG-PV_3024x.jpg?v=1755325114",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332409-YG-T2V_3024x.jpg?v=1694434218",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/hope-diamond-eternity-ring",
-        "description": "Hope Diamond Eternity Ring",
-        "occasion": ['Special Events'],
-        "style": ['Classic'],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Amour Diamond Earring",
-        "price": 32792,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47051-V2-YG-FV_3024x.jpg?v=1709889123",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47051-V2-YG-PV_3024x.jpg?v=1709889273",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/amour-diamond-earring",
-        "description": "Amour Diamond Earring - Evol Jewels",
-        "occasion": ['Romantic'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Amour Diamond Ring",
-        "price": 33370,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-47062-V17-YG-PV_3024x.jpg?v=1710584357",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-47062-V17-YG-FV_3024x.jpg?v=1710584357",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/amour-diamond-ring",
-        "description": "Amour Diamond Ring - Evol Jewels",
-        "occasion": ['Romantic'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Clique Diamond Studs",
-        "price": 35506,
-        "category": "Earrings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN332458-RG-TV_3024x.jpg?v=1755326424",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SERN332458-RG-FV_3024x.jpg?v=1755326432",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/clique-diamond-studs",
-        "description": "Clique Diamond Studs",
-        "occasion": ['Everyday', 'Work'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Mirage Diamond Earrings",
-        "price": 35212,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51835-Lot5-S63-YG-PV_3024x.png?v=1719383938",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51835-Lot5-S63-YG-TV_3024x.png?v=1719383938",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/mirage-diamond-earrings-1",
-        "description": "Mirage Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Solar diamond eternity ring",
-        "price": 35012,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46472-ER-10-YG-PV_3024x.jpg?v=1709796443",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46472-ER-10-YG-FV_3024x.jpg?v=1709796443",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/solar-diamond-eternity-ring",
-        "description": "Solar diamond eternity ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Grapevine Diamond Earrings",
-        "price": 36333,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27549-E03-YG-PV_3024x.jpg?v=1709125898",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27549-E03-YG-TV_3024x.jpg?v=1709125898",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/grapevine-diamond-earrings",
-        "description": "Grapevine Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Petite zen eternity ring",
-        "price": 35341,
-        "category": "Rings",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46476-ER-15-WG-PV_3024x.jpg?v=1709805604",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-46476-ER-15-WG-FV_3024x.jpg?v=1709805604",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/petite-zen-eternity-ring",
-        "description": "Petite zen eternity ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Dutchess Diamond Ring",
-        "price": 43415,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-31329-LR60282-YG-PV_3024x.jpg?v=1692276243",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-RN-R-31329-LR60282-YG-T2V_3024x.jpg?v=1694436245",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/dutchess-diamond-ring",
-        "description": "Dutchess Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Vintage'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Yara Diamond Pendant",
-        "price": 43968,
-        "category": "Necklaces",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['16 inch', '18 inch', '20 inch'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/CPND330239-RG-PV_3024x.jpg?v=1755327077",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/CPND330239-RG-TV_3024x.jpg?v=1755327083",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/yara-diamond-pendant",
-        "description": "Yara Diamond Pendant",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Florentine Grace Diamond Earrings",
-        "price": 44086,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51827-Lot5-S34-YG-PV_829a6a3c-d4db-4800-9fc5-188fbcd85717_3024x.png?v=1719572101",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-51827-Lot5-S34-YG-TV_7baa627a-492e-4056-971d-8c1c7b853f6b_3024x.png?v=1719572101",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/florentine-grace-diamond-earrings",
-        "description": "Florentine Grace Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic'],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Sprinkle Diamond Bracelet",
-        "price": 44113,
-        "category": "Bracelets",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['One Size'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-31326-LB70662-RG-PV_3024x.jpg?v=1695302214",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-BR-R-31326-LB70662-RG-T2V_3024x.jpg?v=1695302214",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/sprinkle-diamond-bracelet",
-        "description": "Sprinkle Diamond Bracelet - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Oscar Diamond Half Eternity Ring",
-        "price": 44326,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG317630-RG-PV_3024x.jpg?v=1680190113",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG317630-RG-T2V_3024x.jpg?v=1694434966",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/oscar-diamond-half-eternity-ring",
-        "description": "Oscar Diamond Half Eternity Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Eros Diamond Halo Ring",
-        "price": 44483,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332508-RG-PV_8d59e480-92a5-4ab6-a004-5cffc59de1be_3024x.jpg?v=1755324597",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332508-RG-T2V_3024x.jpg?v=1755324603",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/eros-diamond-halo-ring",
-        "description": "Eros Diamond Halo Ring",
-        "occasion": ['Romantic', 'Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Flutter Diamond earrings",
-        "price": 44534,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-52362-ER70872-YG-PV_3024x.png?v=1721637490",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-52362-ER70872-YG-TV_3024x.png?v=1721637490",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/flutter-diamond-earrings",
-        "description": "Flutter Diamond earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Bohemian'],
-        "celebrity_vibe": "Boho Luxe"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Better Half Diamond Earrings",
-        "price": 56626,
-        "category": "Rings",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47057-V15-WG-PV_3024x.jpg?v=1710577384",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-47057-V15-WG-TV_3024x.jpg?v=1710577384",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/better-half-diamond-earrings",
-        "description": "Better Half Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Nomadic Diamond Huggie Earring",
-        "price": 57005,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-31318-ER60416-YG-FV_3024x.jpg?v=1694514501",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-31318-ER60416-YG-PV_3024x.jpg?v=1694514501",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/nomadic-diamond-huggie-earring",
-        "description": "Nomadic Diamond Huggie Earring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Bohemian'],
-        "celebrity_vibe": "Boho Luxe"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Urbane Diamond J-hoop Earrings",
-        "price": 61075,
-        "category": "Rings",
-        "metal_types": ['Rose Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/SERN332380-RG-PV_2906fcc2-1b8a-407b-a7f6-7b9d800ce8b9_3024x.jpg?v=1755325278",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/SERN332380-RG-TV_fc321226-29c9-4240-b930-e9fa79d89647_3024x.jpg?v=1753187465",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/urbane-diamond-j-hoop-earrings",
-        "description": "Urbane Diamond J-hoop Earrings",
-        "occasion": ['Special Events'],
-        "style": ['Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Reverie Diamond Earrings",
-        "price": 62331,
-        "category": "Rings",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27556-M02-RG-PV_3024x.jpg?v=1696855803",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/files/PMA-ER-R-27556-M02-RG-FV_3024x.jpg?v=1696855803",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/valentina-diamond-earrings",
-        "description": "Valentina Diamond Earrings - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Marion Diamond Halo Pendant",
-        "price": 62696,
-        "category": "Necklaces",
-        "metal_types": ['Yellow Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": ['16 inch', '18 inch', '20 inch'],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SPND340240-YG-PV_3024x.jpg?v=1675343506",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SPND340240-YG-TV_3024x.jpg?v=1694434495",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/marion-diamond-halo-pendant",
-        "description": "Marion Diamond Halo Pendant - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Classic', 'Modern'],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Victoria Diamond Ring",
-        "price": 68128,
-        "category": "Rings",
-        "metal_types": ['White Gold'],
-        "karat_options": ['14 KT'],
-        "sizes": [5],
-        "images": [
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332383-WG-PV_3024x.jpg?v=1675080477",
-            "https://cdn.shopify.com/s/files/1/0674/7665/2346/products/SRNG332383-WG-T2V_3024x.jpg?v=1694435813",
-        ],
-        "url": "https://evoljewels.com/collections/all-products/products/victoria-diamond-ring",
-        "description": "Victoria Diamond Ring - Evol Jewels",
-        "occasion": ['Special Events'],
-        "style": ['Vintage'],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    # Ultra-Luxury Collection - ₹1L-₹2L Range
-    {
-        "id": str(uuid4()),
-        "name": "Empress Diamond Necklace Set",
-        "price": 125000,
-        "category": "Necklaces",
-        "metal_types": ["Yellow Gold"],
-        "karat_options": ["18 KT"],
-        "sizes": ["18 inch"],
-        "images": [
-            "https://images.unsplash.com/photo-1599643478518-a784e5dc4c8f?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Stunning diamond necklace set with intricate craftsmanship, perfect for grand celebrations",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Classic"],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Royal Platinum Diamond Ring",
-        "price": 135000,
-        "category": "Rings",
-        "metal_types": ["Platinum"],
-        "karat_options": ["PT 950"],
-        "sizes": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16],
-        "images": [
-            "https://images.unsplash.com/photo-1605100804763-247f67b3557e?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Exquisite platinum diamond ring with rare gemstones for the discerning connoisseur",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Modern", "Classic"],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Heritage Rose Gold Bracelet",
-        "price": 145000,
-        "category": "Bracelets",
-        "metal_types": ["Rose Gold"],
-        "karat_options": ["18 KT"],
-        "sizes": ["7 inch", "7.5 inch"],
-        "images": [
-            "https://images.unsplash.com/photo-1611591437281-460bfbe1220a?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Elegant rose gold bracelet with vintage-inspired design and premium diamonds",
-        "occasion": ["Special Events"],
-        "style": ["Vintage", "Classic"],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Celestial White Gold Earrings",
-        "price": 155000,
-        "category": "Earrings",
-        "metal_types": ["White Gold"],
-        "karat_options": ["18 KT"],
-        "sizes": ["One Size"],
-        "images": [
-            "https://images.unsplash.com/photo-1535632066927-ab7c9ab60908?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Breathtaking white gold chandelier earrings with cascading diamonds",
-        "occasion": ["Special Events"],
-        "style": ["Modern", "Classic"],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Maharani Gold & Diamond Set",
-        "price": 180000,
-        "category": "Jewelry",
-        "metal_types": ["Yellow Gold"],
-        "karat_options": ["22 KT"],
-        "sizes": ["One Size"],
-        "images": [
-            "https://images.unsplash.com/photo-1515562141207-7a88fb7ce338?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Traditional bridal set with elaborate gold work and precious gemstones",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Classic", "Vintage"],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    # Ultra-Luxury Collection - ₹2L-₹4L Range
-    {
-        "id": str(uuid4()),
-        "name": "Grand Platinum Tiara",
-        "price": 250000,
-        "category": "Jewelry",
-        "metal_types": ["Platinum"],
-        "karat_options": ["PT 950"],
-        "sizes": ["One Size"],
-        "images": [
-            "https://images.unsplash.com/photo-1591085686350-798c0f9faa7f?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Majestic platinum tiara adorned with rare diamonds for royal occasions",
-        "occasion": ["Special Events"],
-        "style": ["Classic"],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Imperial Rose Gold Collar Necklace",
-        "price": 280000,
-        "category": "Necklaces",
-        "metal_types": ["Rose Gold"],
-        "karat_options": ["18 KT"],
-        "sizes": ["16 inch"],
-        "images": [
-            "https://images.unsplash.com/photo-1603561596112-0a132b757442?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Statement collar necklace in rose gold with flawless diamond arrangement",
-        "occasion": ["Special Events"],
-        "style": ["Modern", "Classic"],
-        "celebrity_vibe": "Editorial Chic"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Legacy White Gold Diamond Suite",
-        "price": 320000,
-        "category": "Jewelry",
-        "metal_types": ["White Gold"],
-        "karat_options": ["18 KT"],
-        "sizes": ["One Size"],
-        "images": [
-            "https://images.unsplash.com/photo-1617038260770-a7d7f0ebfcce?q=80&w=1000"
-        ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Complete bridal suite featuring necklace, earrings, and ring in white gold",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Classic", "Modern"],
-        "celebrity_vibe": "Hollywood Glam"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Opulent Yellow Gold Heirloom Set",
-        "price": 380000,
-        "category": "Jewelry",
-        "metal_types": ["Yellow Gold"],
-        "karat_options": ["22 KT"],
-        "sizes": ["One Size"],
-        "images": [
-            "https://images.unsplash.com/photo-1601121141461-9d6647bca1ed?q=80&w=1000"
+]
+VIBE_WARMUP = os.environ.get("VIBE_WARMUP", "true").lower() in ("1", "true", "yes")
+VIBE_WARMUP_INTERVAL = float(os.environ.get("VIBE_WARMUP_INTERVAL_SECONDS", "86400"))
+VIBE_WARMUP_CONCURRENCY = int(os.environ.get("VIBE_WARMUP_CONCURRENCY", "4"))
+# Most provider slots stay free for live surveys while the table fills
+VIBE_WARMUP_SLOT_SHARE = float(os.environ.get("VIBE_WARMUP_SLOT_SHARE", "0.25"))
+# A claimed row is left to its worker for this long; must exceed VIBE_DEADLINE
+VIBE_WARMUP_LEASE = float(os.environ.get("VIBE_WARMUP_LEASE_SECONDS", "120"))
+WORKER_ID = uuid.uuid4().hex
+
+vibe_table: Dict[str, AIResponse] = {}
+vibe_table_stats: Dict[str, Any] = {"hits": 0, "misses": 0, "last_run": None, "filled": 0, "failed": 0, "claimed_elsewhere": 0}
+_vibe_warmup_task: Optional[asyncio.Task] = None
+
+
+def survey_option_space() -> List[AIRequest]:
+    space: Dict[str, AIRequest] = {}
+    for options in SURVEY_OPTION_SETS:
+        for occasion in options["occasions"]:
+            for style in options["styles"]:
+                for budget in options["budgets"]:
+                    req = AIRequest(occasion=occasion, style=style, budget=budget)
+                    space.setdefault(vibe_cache_key(req), req)
+    return list(space.values())
+
+
+async def load_vibe_table() -> None:
+    table: Dict[str, AIResponse] = {}
+    # Rows that are only claimed have no vibe yet
+    async for doc in db.vibe_table.find({"vibe": {"$exists": True}}, {"_id": 0}):
+        table[doc["key"]] = AIResponse(vibe=doc["vibe"], explanation=doc["explanation"], source=doc["source"])
+    vibe_table.clear()
+    vibe_table.update(table)
+
+
+async def claim_vibe_row(key: str, stale_before: datetime) -> bool:
+    """Take the lease on a stale or missing row; False if it is fresh or leased elsewhere."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.vibe_table.find_one_and_update(
+            {
+                "key": key,
+                "refreshed_at": {"$not": {"$gt": stale_before}},
+                "claimed_at": {"$not": {"$gt": now - timedelta(seconds=VIBE_WARMUP_LEASE)}},
+            },
+            {"$set": {"claimed_at": now, "claimed_by": WORKER_ID}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The row exists but did not match: another worker holds it or it is fresh
+        return False
+    return True
+
+
+async def refresh_vibe_table() -> None:
+    """Compute missing or stale table rows with bounded LLM concurrency.
+
+    Before calling the LLM a worker claims the row with a lease, so
+    workers running the job at the same time split the rows between them
+    instead of each filling all of them.
+    """
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=VIBE_WARMUP_INTERVAL)
+    fresh = {doc["key"] async for doc in db.vibe_table.find({"refreshed_at": {"$gt": stale_before}}, {"key": 1})}
+    todo = [req for req in survey_option_space() if vibe_cache_key(req) not in fresh]
+    # Unhedged, each fill holds one openai slot at a time
+    share = int(llm_provider_limiters["openai"].limit * VIBE_WARMUP_SLOT_SHARE)
+    sem = asyncio.Semaphore(max(1, min(VIBE_WARMUP_CONCURRENCY, share)))
+    filled = failed = claimed_elsewhere = 0
+
+    async def fill(req: AIRequest) -> None:
+        nonlocal filled, failed, claimed_elsewhere
+        key = vibe_cache_key(req)
+        async with sem:
+            if not await claim_vibe_row(key, stale_before):
+                claimed_elsewhere += 1
+                return
+            try:
+                ai = await fetch_ai_vibe(req, hedge=False)
+            except Exception:
+                ai = None
+        if ai is None:
+            failed += 1
+            # Let another worker (or the next run) retry the row
+            await db.vibe_table.update_one({"key": key, "claimed_by": WORKER_ID}, {"$unset": {"claimed_at": "", "claimed_by": ""}})
+            return
+        await db.vibe_table.update_one(
+            {"key": key},
+            {
+                "$set": {**ai.model_dump(), "key": key, "survey": req.model_dump(), "refreshed_at": datetime.now(timezone.utc)},
+                "$unset": {"claimed_at": "", "claimed_by": ""},
+            },
+            upsert=True,
+        )
+        vibe_table[key] = ai
+        filled += 1
+
+    await asyncio.gather(*(fill(req) for req in todo))
+    await load_vibe_table()
+    vibe_table_stats.update(last_run=now_iso(), filled=filled, failed=failed, claimed_elsewhere=claimed_elsewhere)
+    logger.info(f"Vibe table refreshed: {filled} filled, {failed} failed, {claimed_elsewhere} left to other workers, {len(vibe_table)} rows")
+
+
+async def vibe_warmup_loop() -> None:
+    while True:
+        try:
+            await load_vibe_table()
+            if get_llm_client("openai") is not None:
+                await refresh_vibe_table()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Vibe table warm-up failed: {e}")
+        await asyncio.sleep(VIBE_WARMUP_INTERVAL)
+
+# ------------------ Session write-behind ------------------
+SESSION_QUEUE_MAX = int(os.environ.get("SESSION_QUEUE_MAX", "5000"))
+SESSION_FLUSH_BATCH = int(os.environ.get("SESSION_FLUSH_BATCH", "100"))
+SESSION_FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL_SECONDS", "0.5"))
+SESSION_FLUSH_RETRY_DELAY = float(os.environ.get("SESSION_FLUSH_RETRY_DELAY_SECONDS", "2"))
+SESSION_FLUSH_MAX_ATTEMPTS = int(os.environ.get("SESSION_FLUSH_MAX_ATTEMPTS", "5"))
+
+
+def transient_write_error(e: BaseException) -> bool:
+    """Whether retrying the same write can succeed (network, failover, write concern)."""
+    if isinstance(e, ConnectionFailure):
+        return True
+    if isinstance(e, BulkWriteError):
+        return bool(e.details.get("writeConcernErrors"))
+    return isinstance(e, PyMongoError) and e.has_error_label("RetryableWriteError")
+
+
+class SessionWriter:
+    """Buffers session documents and writes them with insert_many.
+
+    Documents stay readable through get() until their batch is stored. When
+    the queue is full, submit() falls back to a direct insert_one so the
+    buffer never grows without bound.
+    """
+
+    def __init__(self, collection_name: str, max_queue: int, batch_size: int, interval: float):
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.direct_writes = 0
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+
+    @property
+    def collection(self):
+        return db[self.collection_name]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, doc: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            self.direct_writes += 1
+            await self.collection.insert_one(dict(doc))
+            return
+        self.pending[doc["id"]] = doc
+        self.enqueued += 1
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self.pending.get(doc_id)
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _release(self, batch: List[Dict[str, Any]], rejected: int = 0) -> None:
+        for doc in batch:
+            self.pending.pop(doc["id"], None)
+        self.flushed += len(batch) - rejected
+        self.dropped += rejected
+        self.batches += 1
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Store a batch. Documents the server rejects for good are logged and dropped."""
+        rejected: List[Dict[str, Any]] = []
+        try:
+            # Copies keep the motor-assigned _id out of the readable buffer
+            await self.collection.insert_many([dict(doc) for doc in batch], ordered=False)
+        except BulkWriteError as e:
+            if transient_write_error(e):
+                raise
+            # Duplicates come from a retried batch that partially succeeded
+            rejected = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            for err in rejected:
+                logger.error(f"Session {batch[err['index']]['id']} dropped, write rejected ({err.get('code')}): {err.get('errmsg')}")
+        self._release(batch, len(rejected))
+
+    async def _write_each(self, batch: List[Dict[str, Any]]) -> None:
+        """One document at a time, after the batch failed as a whole (e.g. one is too large)."""
+        rejected = 0
+        for doc in batch:
+            try:
+                await self.collection.insert_one(dict(doc))
+            except DuplicateKeyError:
+                pass
+            except Exception as e:
+                rejected += 1
+                logger.error(f"Session {doc['id']} dropped, write rejected: {e}")
+        self._release(batch, rejected)
+
+    async def _store(self, batch: List[Dict[str, Any]], attempts: int) -> bool:
+        """Write a batch, retrying transient failures up to `attempts` times.
+
+        Returns False when the batch is still unwritten because the database
+        stayed unreachable; its documents are then dropped from the buffer.
+        """
+        for attempt in range(1, attempts + 1):
+            try:
+                await self._write(batch)
+                return True
+            except Exception as e:
+                self.errors += 1
+                if not transient_write_error(e):
+                    logger.error(f"Session flush of {len(batch)} rejected, writing one by one: {e}")
+                    await self._write_each(batch)
+                    return True
+                logger.error(f"Session flush of {len(batch)} failed (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(SESSION_FLUSH_RETRY_DELAY)
+        logger.error(f"Session flush gave up, {len(batch)} sessions lost")
+        self._release(batch, len(batch))
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            await self._store(await self._next_batch(), SESSION_FLUSH_MAX_ATTEMPTS)
+
+    async def close(self) -> None:
+        """Stop the background flusher and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Includes a batch the flusher had dequeued but not yet stored
+        remaining = list(self.pending.values())
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        for i in range(0, len(remaining), self.batch_size):
+            # One attempt each: shutdown does not wait out a database outage
+            if not await self._store(remaining[i:i + self.batch_size], attempts=1):
+                logger.error(f"Session flush on shutdown failed, {len(remaining) - i} sessions lost")
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self.pending),
+            "queue_max": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "direct_writes": self.direct_writes,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "dropped": self.dropped,
+        }
+
+
+session_writer = SessionWriter("sessions", SESSION_QUEUE_MAX, SESSION_FLUSH_BATCH, SESSION_FLUSH_INTERVAL)
+
+
+async def find_session(session_id: str) -> Optional[Dict[str, Any]]:
+    return session_writer.get(session_id) or await db.sessions.find_one({"id": session_id})
+
+# ------------------ Stage timing ------------------
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with counts per bucket and a running sum."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, capped at the largest bound."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {**{str(b): n for b, n in zip(self.bounds, self.counts)}, "+Inf": self.counts[-1]},
+        }
+
+
+# "<route>.<stage>" -> histogram, plus "<route>.<stage>.<desc>" counters for the branch taken
+stage_histograms: Dict[str, LatencyHistogram] = {}
+stage_outcomes: Dict[str, int] = {}
+
+
+class Span:
+    __slots__ = ("name", "desc", "start", "ms")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.desc: Optional[str] = None
+        self.start = time.perf_counter()
+        self.ms = 0.0
+
+
+class StageTimer:
+    """Times the stages of one request for Server-Timing and the stage histograms.
+
+        timer = StageTimer("survey")
+        with timer.stage("vibe") as span:
+            ...
+            span.desc = "ai"
+        timer.finish()
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        span = Span(name)
+        try:
+            yield span
+        finally:
+            span.ms = (time.perf_counter() - span.start) * 1000
+            self.spans.append(span)
+            self.record(name, span.ms, span.desc)
+
+    def record(self, name: str, ms: float, desc: Optional[str] = None) -> None:
+        key = f"{self.route}.{name}"
+        hist = stage_histograms.get(key)
+        if hist is None:
+            hist = stage_histograms[key] = LatencyHistogram()
+        hist.observe(ms)
+        STAGE_LATENCY.labels(self.route, name).observe(ms / 1000)
+        if desc is not None:
+            outcome = f"{key}.{desc}"
+            stage_outcomes[outcome] = stage_outcomes.get(outcome, 0) + 1
+
+    def finish(self) -> None:
+        total = Span("total")
+        total.ms = (time.perf_counter() - self.start) * 1000
+        self.spans.append(total)
+        self.record("total", total.ms)
+
+    def header(self) -> str:
+        parts = []
+        for span in self.spans:
+            part = f"{span.name};dur={span.ms:.2f}"
+            if span.desc:
+                part += f';desc="{span.desc}"'
+            parts.append(part)
+        return ", ".join(parts)
+
+# ------------------ Fast JSON responses ------------------
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for trusted internal data, encoded with orjson.
+
+    Routes return an instance directly, so FastAPI skips response_model
+    validation and jsonable_encoder. Pydantic models are dumped without
+    revalidation. Without orjson this falls back to the stdlib encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            if isinstance(content, BaseModel):
+                return content.model_dump_json().encode("utf-8")
+            return super().render(content)
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+# ------------------ Response compression ------------------
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
+# Small bodies with an ETag (passports) are compressed once per tag, so they can
+# afford the densest setting; large or per-query ones like product pages cannot
+COMPRESS_BROTLI_CACHED_QUALITY = int(os.environ.get("COMPRESS_BROTLI_CACHED_QUALITY", "11"))
+COMPRESS_CACHED_QUALITY_MAX_BYTES = int(os.environ.get("COMPRESS_CACHED_QUALITY_MAX_BYTES", "32768"))
+# Larger bodies are compressed in a worker thread to keep the event loop free
+COMPRESS_THREAD_MIN_BYTES = int(os.environ.get("COMPRESS_THREAD_MIN_BYTES", "65536"))
+COMPRESS_CACHE_MAX_ENTRIES = int(os.environ.get("COMPRESS_CACHE_MAX_ENTRIES", "512"))
+COMPRESS_SKIP_PATHS = set(os.environ.get("COMPRESS_SKIP_PATHS", "/api/,/api/health,/api/ping").split(","))
+
+compressed_bodies = TTLCache(COMPRESS_CACHE_MAX_ENTRIES, float("inf"), name="compressed_body")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Tag of the compressed representation: '"abc"' becomes '"abc-br"'."""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def strip_etag_encoding(tag: str) -> str:
+    """The identity tag behind a weak or per-encoding tag, for If-None-Match checks."""
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def compress_body(body: bytes, encoding: str, cached: bool) -> bytes:
+    if encoding == "br":
+        densest = cached and len(body) <= COMPRESS_CACHED_QUALITY_MAX_BYTES
+        return brotli.compress(body, quality=COMPRESS_BROTLI_CACHED_QUALITY if densest else COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+async def compress_body_async(body: bytes, encoding: str, cached: bool) -> bytes:
+    if len(body) >= COMPRESS_THREAD_MIN_BYTES:
+        return await asyncio.to_thread(compress_body, body, encoding, cached)
+    return compress_body(body, encoding, cached)
+
+
+class CompressionMiddleware:
+    """Brotli/gzip for buffered responses of at least COMPRESS_MIN_BYTES.
+
+    Streaming responses (chat SSE), already encoded bodies and the paths in
+    COMPRESS_SKIP_PATHS pass through untouched. A response with an ETag is
+    immutable for that tag, so its compressed form is cached per encoding and
+    sent under a per-encoding tag ("<tag>-br", "<tag>-gzip") so caches never
+    mix up the encoded and identity bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in COMPRESS_SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start.update(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                # Streamed bodies are forwarded as they come instead of buffered
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                return
+            await self.send_buffered(send, start, b"".join(chunks), encoding, request_headers.get("if-none-match"))
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def send_buffered(send, start: Dict[str, Any], body: bytes, encoding: str, if_none_match: Optional[str] = None) -> None:
+        headers = MutableHeaders(scope=start)
+        etag = headers.get("etag")
+        if start["status"] == 304 and etag and if_none_match:
+            # Confirm the encoded representation the client already holds
+            tagged = encoded_etag(etag, encoding)
+            if tagged in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+                headers["ETag"] = tagged
+        elif len(body) >= COMPRESS_MIN_BYTES:
+            if etag:
+                key = f"{encoding}:{etag}"
+                compressed = compressed_bodies.get(key)
+                if compressed is None:
+                    compressed = await compress_body_async(body, encoding, cached=True)
+                    compressed_bodies.set(key, compressed)
+            else:
+                compressed = await compress_body_async(body, encoding, cached=False)
+            if len(compressed) < len(body):
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if etag:
+                    headers["ETag"] = encoded_etag(etag, encoding)
+        headers.add_vary_header("Accept-Encoding")
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
+
+# ------------------ Passport cache ------------------
+# Passports never change after the survey, so serialized bodies are cached by session id
+PASSPORT_CACHE_MAX_ENTRIES = int(os.environ.get("PASSPORT_CACHE_MAX_ENTRIES", "2048"))
+PASSPORT_CACHE_TTL = float(os.environ.get("PASSPORT_CACHE_TTL_SECONDS", "86400"))
+# Sessions, and the passports built from them, expire after this many days; 0 keeps them
+SESSION_RETENTION_DAYS = float(os.environ.get("SESSION_RETENTION_DAYS", "90"))
+# Browsers must not keep serving a passport after the session behind it is deleted
+PASSPORT_MAX_AGE = 31536000 if SESSION_RETENTION_DAYS <= 0 else min(31536000, int(SESSION_RETENTION_DAYS * 86400))
+PASSPORT_CACHE_CONTROL = os.environ.get("PASSPORT_CACHE_CONTROL", f"public, max-age={PASSPORT_MAX_AGE}, immutable")
+
+passport_cache = TTLCache(PASSPORT_CACHE_MAX_ENTRIES, PASSPORT_CACHE_TTL, name="passport")
+passport_not_modified = {"count": 0}
+
+# ------------------ Index management ------------------
+# TTL needs a BSON date, so sessions carry created_ts next to the ISO created_at string
+SESSION_BACKFILL_BATCH = 1000
+
+
+def index_specs() -> Dict[str, List[IndexModel]]:
+    sessions = [IndexModel([("id", ASCENDING)], name="id_unique", unique=True)]
+    if SESSION_RETENTION_DAYS > 0:
+        sessions.append(IndexModel(
+            [("created_ts", ASCENDING)], name="created_ts_ttl",
+            expireAfterSeconds=int(SESSION_RETENTION_DAYS * 86400),
+        ))
+    return {
+        "products": [
+            IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+            IndexModel([("price", ASCENDING)], name="price"),
+            IndexModel([("style_tags", ASCENDING)], name="style_tags"),
+            IndexModel([("occasion_tags", ASCENDING)], name="occasion_tags"),
+            IndexModel([("source", ASCENDING)], name="source"),
+            IndexModel([("category", ASCENDING)], name="category"),
+            IndexModel([("metal_types", ASCENDING)], name="metal_types"),
         ],
-        "url": "https://evoljewels.com/collections/luxury",
-        "description": "Exquisite traditional gold set with intricate detailing and precious stones",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Classic", "Vintage"],
-        "celebrity_vibe": "Vintage Romance"
-    },
-    {
-        "id": str(uuid4()),
-        "name": "Design Your Dream Piece",
-        "price": 0,
-        "category": "Custom",
-        "metal_types": ["Yellow Gold", "White Gold", "Rose Gold", "Platinum"],
-        "karat_options": ["14 KT", "18 KT", "22 KT"],
-        "sizes": ["Custom"],
-        "images": [
-            "https://images.unsplash.com/photo-1599643478518-a784e5dc4c8f?q=80&w=1000"
+        "sessions": sessions,
+        "vibe_cache": [
+            IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
         ],
-        "url": "https://evoljewels.com/pages/custom-jewelry",
-        "description": "Create your own unique piece with our expert jewelers. Perfect for special occasions and personalized gifts.",
-        "occasion": ["Special Events", "Romantic"],
-        "style": ["Classic", "Modern", "Vintage", "Bohemian"],
-        "celebrity_vibe": "Hollywood Glam",
-        "is_custom": True
+        "vibe_table": [IndexModel([("key", ASCENDING)], name="key_unique", unique=True)],
     }
-]
+
+
+async def ensure_index(collection: str, model: IndexModel) -> str:
+    doc = model.document
+    try:
+        await db[collection].create_indexes([model])
+        return "ok"
+    except OperationFailure as e:
+        # IndexOptionsConflict: only a changed TTL can be fixed in place
+        if e.code == 85 and "expireAfterSeconds" in doc:
+            await db.command("collMod", collection, index={"name": doc["name"], "expireAfterSeconds": doc["expireAfterSeconds"]})
+            return "updated"
+        raise
+
+
+index_report: Dict[str, Dict[str, str]] = {}
+
+
+async def ensure_indexes() -> Dict[str, Dict[str, str]]:
+    """Create missing indexes; each failure is logged and reported, never fatal."""
+    report = index_report
+    report.clear()
+    for collection, models in index_specs().items():
+        report[collection] = {}
+        for model in models:
+            name = model.document["name"]
+            try:
+                report[collection][name] = await ensure_index(collection, model)
+            except Exception as e:
+                report[collection][name] = f"error: {e}"
+                logger.error(f"Index {collection}.{name} could not be created: {e}")
+    return report
+
+
+def parse_created_at(value: Any) -> datetime:
+    """created_ts for a stored created_at string; naive times are UTC."""
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        # Unreadable dates start their retention period now instead of never expiring
+        return datetime.now(timezone.utc)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+async def backfill_session_timestamps() -> int:
+    """Give sessions stored before created_ts existed one, so the TTL index can expire them."""
+    updated = 0
+    cursor = db.sessions.find({"created_ts": {"$exists": False}}, {"_id": 1, "created_at": 1})
+    ops: List[UpdateOne] = []
+    async for doc in cursor:
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"created_ts": parse_created_at(doc.get("created_at"))}}))
+        if len(ops) >= SESSION_BACKFILL_BATCH:
+            updated += (await db.sessions.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.sessions.bulk_write(ops, ordered=False)).modified_count
+    if updated:
+        logger.info(f"Backfilled created_ts on {updated} sessions")
+    return updated
+
+
+async def index_usage() -> Dict[str, List[Dict[str, Any]]]:
+    usage: Dict[str, List[Dict[str, Any]]] = {}
+    for collection in index_specs():
+        rows = await db[collection].aggregate([{"$indexStats": {}}]).to_list(100)
+        usage[collection] = [
+            {"name": row["name"], "ops": row["accesses"]["ops"], "since": row["accesses"]["since"]}
+            for row in sorted(rows, key=lambda r: r["name"])
+        ]
+    return usage
+
+# ------------------ Catalog snapshot ------------------
+class TagIncidence:
+    """Sparse items x distinct-lowercased-tag incidence for one tag field.
+
+    Stored as COO pairs (one per tag occurrence, so duplicate tags count
+    twice, as the per-item loop did) plus a by-tag ordering for lookups.
+    Memory is O(tag occurrences), not O(items x distinct tags).
+    """
+
+    def __init__(self, tag_lists: List[List[str]]):
+        self.n_items = len(tag_lists)
+        self.columns: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, tags in enumerate(tag_lists):
+            for tag in tags:
+                rows.append(row)
+                cols.append(self.columns.setdefault(tag.lower(), len(self.columns)))
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        # CSC-style index: rows of tag c are by_tag_rows[tag_start[c]:tag_start[c + 1]]
+        order = np.argsort(self.cols, kind="stable")
+        self.by_tag_rows = self.rows[order]
+        self.tag_start = np.concatenate(([0], np.cumsum(np.bincount(self.cols, minlength=len(self.columns)))))
+
+    def substring_hits(self, words: List[str]) -> np.ndarray:
+        """Per item, the number of (tag, word) pairs where the word occurs in the tag."""
+        per_tag = np.array(
+            [sum(1 for q in words if q in tag) for tag in self.columns],
+            dtype=np.float64,
+        )
+        if not len(self.rows):
+            return np.zeros(self.n_items, dtype=np.float64)
+        return np.bincount(self.rows, weights=per_tag[self.cols], minlength=self.n_items)
+
+    def has_tag(self, tag: str) -> np.ndarray:
+        mask = np.zeros(self.n_items, dtype=bool)
+        col = self.columns.get(tag)
+        if col is not None:
+            mask[self.by_tag_rows[self.tag_start[col]:self.tag_start[col + 1]]] = True
+        return mask
+
+
+class CompiledCatalog:
+    """Array form of the catalog used to score surveys in recommend_products."""
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.price_inr = np.array([float(it.get("price", 0)) * USD_TO_INR for it in items], dtype=np.float64)
+        # np.rint rounds half to even, same as round()
+        self.price_inr_rounded = np.rint(self.price_inr).astype(np.int64)
+        self.style = TagIncidence([it.get("style_tags", []) for it in items])
+        self.occasion = TagIncidence([it.get("occasion_tags", []) for it in items])
+        self.metal = TagIncidence([it.get("metal_types", []) for it in items])
+        self.category = TagIncidence([[it["category"]] if it.get("category") else [] for it in items])
+
+    def filter_mask(self, min_inr: Optional[float], max_inr: Optional[float], filters: Dict[str, List[str]]) -> np.ndarray:
+        """Items matching every filter; values within one filter are alternatives."""
+        mask = np.ones(len(self.price_inr), dtype=bool)
+        if min_inr is not None:
+            mask &= self.price_inr_rounded >= min_inr
+        if max_inr is not None:
+            mask &= self.price_inr_rounded <= max_inr
+        for field, values in filters.items():
+            incidence: TagIncidence = getattr(self, field)
+            any_of = np.zeros_like(mask)
+            for value in values:
+                any_of |= incidence.has_tag(value.lower())
+            mask &= any_of
+        return mask
+
+    def score(self, s: SurveyInput, vibe: str, min_inr: float, max_inr: float) -> tuple:
+        """Return (scores, in_budget) arrays aligned with the snapshot items."""
+        score = self.style.substring_hits(s.style.lower().split()) * 1.5
+        score = score + self.occasion.substring_hits(s.occasion.lower().split()) * 1.2
+        score = score + np.where(self.style.has_tag(vibe.split()[0].lower()), 1.0, 0.0)
+        # bias towards mid INR price range
+        score = score + np.where((self.price_inr >= 8000) & (self.price_inr <= 65000), 0.2, 0.0)
+        in_budget = (self.price_inr >= min_inr) & (self.price_inr <= max_inr)
+        return score, in_budget
+
+    def rounded_in_budget(self, min_inr: float, max_inr: float) -> np.ndarray:
+        """Budget mask on whole-rupee prices, as shown to shoppers."""
+        return (self.price_inr_rounded >= min_inr) & (self.price_inr_rounded <= max_inr)
+
+
+def top_k_positions(score: np.ndarray, mask: np.ndarray, k: int) -> List[int]:
+    """Positions of the k best masked scores; ties keep catalog order."""
+    candidates = np.flatnonzero(mask)
+    cand_scores = score[candidates]
+    if len(candidates) > k:
+        kth = cand_scores[np.argpartition(-cand_scores, k - 1)[k - 1]]
+        keep = cand_scores >= kth
+        candidates, cand_scores = candidates[keep], cand_scores[keep]
+    order = np.lexsort((candidates, -cand_scores))[:k]
+    return candidates[order].tolist()
+
+
+class CatalogSnapshot:
+    """Immutable, process-local copy of db.products read by the recommenders.
+
+    A new snapshot is built on every refresh and swapped in as a whole, so a
+    request always sees one consistent catalog version.
+    """
+
+    def __init__(self, version: int, items: List[Dict[str, Any]], shared_version: int = 0):
+        self.version = version
+        # db.catalog_meta version this snapshot was loaded at; same in every worker
+        self.shared_version = shared_version
+        self.items = items
+        self.compiled = CompiledCatalog(items)
+        self.positions = {it["id"]: pos for pos, it in enumerate(items)}
+        # Content digest, identical across workers that loaded the same products
+        self.digest = hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self.loaded_at = now_iso()
+
+
+_catalog = CatalogSnapshot(0, [])
+_catalog_lock = asyncio.Lock()
+# How often a worker asks Mongo whether another worker changed the catalog
+CATALOG_VERSION_CHECK = float(os.environ.get("CATALOG_VERSION_CHECK_SECONDS", "5"))
+_catalog_checked_at = 0.0
+
+
+def get_catalog() -> CatalogSnapshot:
+    return _catalog
+
+
+async def shared_catalog_version() -> int:
+    doc = await db.catalog_meta.find_one({"_id": "products"})
+    return doc["version"] if doc else 0
+
+
+async def bump_catalog_version() -> None:
+    await db.catalog_meta.update_one(
+        {"_id": "products"},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+async def refresh_catalog() -> CatalogSnapshot:
+    """Reload this worker's snapshot from Mongo and atomically swap it in."""
+    global _catalog, _catalog_checked_at
+    async with _catalog_lock:
+        _catalog_checked_at = time.monotonic()
+        # Read the version first: a write racing the load bumps it again and triggers another reload
+        shared_version = await shared_catalog_version()
+        items = await db.products.find({}, {"_id": 0}).to_list(None)
+        _catalog = CatalogSnapshot(_catalog.version + 1, items, shared_version)
+    logger.info(f"Catalog snapshot v{_catalog.version} (shared v{shared_version}) loaded with {len(items)} products")
+    return _catalog
+
+
+async def publish_catalog_change() -> CatalogSnapshot:
+    """Call after every write to db.products (startup seeding, admin imports).
+
+    Bumps the shared version so other workers reload within
+    CATALOG_VERSION_CHECK, and reloads this worker right away.
+    """
+    await bump_catalog_version()
+    return await refresh_catalog()
+
+
+async def ensure_catalog() -> CatalogSnapshot:
+    """Current snapshot, reloaded when another worker published a catalog change."""
+    global _catalog_checked_at
+    # Startup normally loads the snapshot; this covers a failed or skipped load.
+    if _catalog.version == 0:
+        return await refresh_catalog()
+    now = time.monotonic()
+    if now - _catalog_checked_at < CATALOG_VERSION_CHECK:
+        return _catalog
+    _catalog_checked_at = now
+    try:
+        shared_version = await shared_catalog_version()
+    except Exception as e:
+        logger.warning(f"Catalog version check failed, serving snapshot v{_catalog.version}: {e}")
+        return _catalog
+    if shared_version != _catalog.shared_version:
+        return await refresh_catalog()
+    return _catalog
+
+
+async def recommend_products(s: SurveyInput, vibe: str) -> List[RecommendationItem]:
+    # Compare budgets in INR using USD price converted
+    min_inr, max_inr = BUDGET_RANGES_INR.get(s.budget, (0, 10**12))
+
+    catalog = await ensure_catalog()
+    items = catalog.items
+
+    score, in_budget = catalog.compiled.score(s, vibe, min_inr, max_inr)
+    top = [items[pos] for pos in top_k_positions(score, in_budget, 4)]
+
+    recs: List[RecommendationItem] = []
+    for it in top:
+        price_usd = float(it.get("price", 0))
+        price_inr = int(round(price_usd * USD_TO_INR))
+        reason_bits = []
+        if any(k in (s.style.lower()) for k in it.get("style_tags", [])):
+            reason_bits.append("matches your style preference")
+        if any(k in (s.occasion.lower()) for k in it.get("occasion_tags", [])):
+            reason_bits.append("perfect for your occasion")
+        reason_bits.append(f"within your budget at {format_inr(price_inr)}")
+        reason = ", ".join(reason_bits) if reason_bits else "tailored to your inputs"
+        recs.append(RecommendationItem(product=Product(**it), reason=reason))
+    if len(recs) < 3:
+        # Fill with other in-budget items in catalog order, straight from the compiled mask
+        seen_ids = {it["id"] for it in top}
+        for pos in np.flatnonzero(catalog.compiled.rounded_in_budget(min_inr, max_inr)).tolist():
+            it = items[pos]
+            if it["id"] in seen_ids:
+                continue
+            seen_ids.add(it["id"])
+            price_inr = int(catalog.compiled.price_inr_rounded[pos])
+            recs.append(RecommendationItem(product=Product(**it), reason=f"great fit for your budget at {format_inr(price_inr)}"))
+            if len(recs) >= 4:
+                break
+    return recs
+
+# -------------------------------------------------
+# Routes
+# -------------------------------------------------
+@api.get("/health")
+async def health():
+    return {"ok": True, "time": now_iso()}
+
+@api.get("/")
+async def root():
+    return {"message": "Evol Jewels AI Stylist API"}
+
+PRODUCT_FIELD_DEFAULTS = {name: None if field.is_required() else field.default for name, field in Product.model_fields.items()}
+PRODUCT_PAGE_MAX = int(os.environ.get("PRODUCT_PAGE_MAX", "1000"))
+
+
+def split_param(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else []
+
+
+@api.get("/products", response_model=List[Product], response_class=FastJSONResponse)
+async def list_products(
+    request: Request,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    min_inr: Optional[float] = None,
+    max_inr: Optional[float] = None,
+    style: Optional[str] = None,
+    occasion: Optional[str] = None,
+    metal: Optional[str] = None,
+    category: Optional[str] = None,
+):
+    """Page through the catalog snapshot in catalog order.
+
+    Comma-separated style/occasion/metal/category values match any of the
+    given tags. The id of the last product on a page is returned in
+    X-Next-Cursor; pass it back as `cursor` for the next page.
+    """
+    catalog = await ensure_catalog()
+    etag = '"' + hashlib.sha256(f"{catalog.digest}?{request.url.query}".encode()).hexdigest()[:32] + '"'
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    projection = ["id"] + [f for f in split_param(fields) if f != "id"] if fields else list(PRODUCT_FIELD_DEFAULTS)
+    unknown = [f for f in projection if f not in PRODUCT_FIELD_DEFAULTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    start = 0
+    if cursor:
+        if cursor not in catalog.positions:
+            raise HTTPException(status_code=400, detail="Cursor no longer in catalog")
+        start = catalog.positions[cursor] + 1
+    filters = {
+        name: values
+        for name, values in (("style", split_param(style)), ("occasion", split_param(occasion)), ("metal", split_param(metal)), ("category", split_param(category)))
+        if values
+    }
+    mask = catalog.compiled.filter_mask(min_inr, max_inr, filters)
+    limit = min(limit, PRODUCT_PAGE_MAX)
+    positions = np.flatnonzero(mask[start:])[:limit + 1] + start
+    page = positions[:limit].tolist()
+    body = [{f: catalog.items[pos].get(f, PRODUCT_FIELD_DEFAULTS[f]) for f in projection} for pos in page]
+    headers = {"X-Catalog-Version": str(catalog.shared_version), **cache_headers}
+    if len(positions) > limit:
+        headers["X-Next-Cursor"] = catalog.items[page[-1]]["id"]
+    return FastJSONResponse(content=body, headers=headers)
+
+@api.post("/ai/vibe", response_model=AIResponse)
+async def ai_vibe(payload: AIRequest):
+    ai, _ = await get_ai_vibe(payload)
+    if ai:
+        return ai
+    LLM_FALLBACKS.labels("vibe").inc()
+    vibe = match_vibe(SurveyInput(**payload.model_dump()))
+    return AIResponse(vibe=vibe, explanation=vibe_explanation(vibe), source="rules")
+
+@api.get("/ai/vibe/cache")
+async def ai_vibe_cache_stats():
+    return {
+        "local": vibe_cache.stats(),
+        "shared": {"enabled": VIBE_CACHE_SHARED, **vibe_cache_shared_stats},
+        "single_flight": vibe_flights.stats(),
+        "table": {"enabled": VIBE_WARMUP, "rows": len(vibe_table), **vibe_table_stats},
+    }
+
+@api.get("/metrics")
+async def metrics():
+    """Prometheus text exposition; aggregated across workers in multiprocess mode."""
+    if prometheus_client is None:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+    return Response(content=render_metrics(), headers={"Content-Type": prometheus_client.CONTENT_TYPE_LATEST})
+
+@api.get("/timings")
+async def stage_timings():
+    return {
+        "stages": {key: hist.snapshot() for key, hist in sorted(stage_histograms.items())},
+        "outcomes": dict(sorted(stage_outcomes.items())),
+    }
+
+@api.get("/admin/indexes")
+async def admin_indexes():
+    return {"ensured": index_report, "usage": await index_usage()}
+
+@api.get("/sessions/writer")
+async def session_writer_stats():
+    return session_writer.stats()
+
+@api.post("/survey", response_model=RecommendationResponse, response_class=FastJSONResponse)
+async def submit_survey(payload: SurveyInput):
+    timer = StageTimer("survey")
+    with timer.stage("vibe") as span:
+        ai, tier = await get_ai_vibe(AIRequest(**payload.model_dump()))
+        if ai:
+            vibe = ai.vibe
+            explanation = ai.explanation
+            engine = "ai"
+        else:
+            vibe = match_vibe(payload)
+            explanation = vibe_explanation(vibe)
+            engine = "rules"
+            LLM_FALLBACKS.labels("vibe").inc()
+        span.desc = f"{engine}:{tier}"
+    mood_img = VIBE_IMAGES.get(vibe)
+    # Get enhanced recommendations using real Evol Jewels data
+    recs: List[RecommendationItem] = []
+    with timer.stage("enhanced") as span:
+        try:
+            recs = await get_enhanced_recommendations(payload.model_dump())
+            span.desc = "hit" if recs else "empty"
+        except Exception as e:
+            logger.error(f"Enhanced recommendation error: {e}")
+            span.desc = "error"
+    if not recs:
+        # Fallback to existing logic
+        with timer.stage("fallback"):
+            recs = await recommend_products(payload, vibe)
+
+    session_id = str(uuid.uuid4())
+    created_at = now_iso()
+    with timer.stage("passport"):
+        # The passport is frozen at survey time so later reads need no product join
+        passport = PassportResponse(
+            session_id=session_id,
+            engine=engine,
+            survey=payload,
+            vibe=vibe,
+            explanation=explanation,
+            recommendations=recs,
+            created_at=created_at,
+        )
+        passport_json = passport.model_dump_json()
+    with timer.stage("session"):
+        await session_writer.submit({
+            "id": session_id,
+            "created_at": created_at,
+            "created_ts": datetime.fromisoformat(created_at),
+            "survey": payload.model_dump(),
+            "vibe": vibe,
+            "explanation": explanation,
+            "engine": engine,
+            "recommendation_product_ids": [r.product.id for r in recs],
+            "passport_json": passport_json,
+        })
+    timer.finish()
+
+    return FastJSONResponse(content=RecommendationResponse(
+        session_id=session_id,
+        engine=engine,
+        vibe=vibe,
+        explanation=explanation,
+        moodboard_image=mood_img,
+        recommendations=recs,
+        created_at=created_at,
+    ), headers={"Server-Timing": timer.header()})
+
+async def load_passport_json(session_id: str) -> Optional[str]:
+    sess = await find_session(session_id)
+    if not sess:
+        return None
+    if sess.get("passport_json"):
+        return sess["passport_json"]
+    # Sessions stored before passport snapshots: join against the current catalog
+    prod_ids = sess.get("recommendation_product_ids", [])
+    prods = await db.products.find({"id": {"$in": prod_ids}}).to_list(200)
+    recs: List[RecommendationItem] = []
+    for it in prods:
+        price_usd = float(it.get("price", 0))
+        price_inr = int(round(price_usd * USD_TO_INR))
+        recs.append(RecommendationItem(product=Product(**it), reason=f"curated for your vibe at {format_inr(price_inr)}"))
+
+    survey = SurveyInput(**sess["survey"]) if isinstance(sess.get("survey"), dict) else SurveyInput(**{})
+    engine = sess.get("engine", "rules")
+    return PassportResponse(
+        session_id=sess["id"],
+        engine=engine,
+        survey=survey,
+        vibe=sess.get("vibe", ""),
+        explanation=sess.get("explanation", ""),
+        recommendations=recs,
+        created_at=sess.get("created_at", now_iso()),
+    ).model_dump_json()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match; the
+    # per-encoding tags CompressionMiddleware sends name the same content
+    return "*" in tags or strip_etag_encoding(etag) in {strip_etag_encoding(t) for t in tags}
+
+
+# Registered before /passport/{session_id} so "cache" is not taken as a session id
+@api.get("/passport/cache")
+async def passport_cache_stats():
+    return {**passport_cache.stats(), "not_modified": passport_not_modified["count"]}
+
+@api.get("/passport/{session_id}", response_model=PassportResponse)
+async def get_passport(session_id: str, request: Request):
+    entry = passport_cache.get(session_id)
+    if entry is None:
+        text = await load_passport_json(session_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        content = text.encode()
+        entry = (content, '"' + hashlib.sha256(content).hexdigest()[:32] + '"')
+        passport_cache.set(session_id, entry)
+    content, etag = entry
+    headers = {"ETag": etag, "Cache-Control": PASSPORT_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        passport_not_modified["count"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+# Register router
+app.include_router(api)
+
+# CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Catalog-Version"],
+)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Product ids are derived from the product URL and name so they stay the same
+# across restarts and re-imports; stored passports reference them.
+CATALOG_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://evoljewels.com/catalog")
+
+
+def stable_product_id(product: Dict[str, Any], source: str = "") -> str:
+    """Id for a catalog record, derived from its URL and name.
+
+    Sources other than the Evol catalog get their own id space, so a sheet
+    row for an Evol product never shares (and overwrites) the Evol document.
+    """
+    key = f"{product.get('url', '')}|{product['name']}"
+    return str(uuid.uuid5(CATALOG_ID_NAMESPACE, f"{source}:{key}" if source else key))
 
 
 # Enhanced Celebrity Style Database
@@ -1518,6 +2148,123 @@ CELEBRITY_STYLE_DATABASE = {
     }
 }
 
+class EvolCatalogIndex:
+    """Evol product records plus inverted indexes for get_enhanced_recommendations.
+
+    Products are referenced by their position in the source list so that
+    filtered results keep catalog order. The custom design option is kept
+    aside and never indexed.
+    """
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        self.custom_option: Optional[Dict[str, Any]] = None
+        self.by_metal: Dict[str, set] = {}
+        self.by_style: Dict[str, set] = {}
+        self.by_occasion: Dict[str, set] = {}
+        priced: List[tuple] = []
+        for pos, product in enumerate(products):
+            if product.get("is_custom"):
+                if self.custom_option is None:
+                    self.custom_option = product
+                continue
+            for metal in product.get("metal_types", []):
+                self.by_metal.setdefault(metal, set()).add(pos)
+            for style in product["style"]:
+                self.by_style.setdefault(style, set()).add(pos)
+            for occasion in product["occasion"]:
+                self.by_occasion.setdefault(occasion, set()).add(pos)
+            priced.append((product["price"], pos))
+        priced.sort()
+        self.sorted_prices = [price for price, _ in priced]
+        self.sorted_positions = [pos for _, pos in priced]
+
+    def in_price_range(self, low: float, high: float) -> set:
+        """Positions of products priced within [low, high], inclusive."""
+        start = bisect.bisect_left(self.sorted_prices, low)
+        end = bisect.bisect_right(self.sorted_prices, high)
+        return set(self.sorted_positions[start:end])
+
+
+# Real Evol Jewels product data lives in data/evol_products.json. It is compiled
+# once into a JSON snapshot (records with stable ids plus indexes) next to it.
+# Every worker loads it at startup through import_evol_products.
+EVOL_CATALOG_PATH = Path(os.environ.get("EVOL_CATALOG_PATH", ROOT_DIR / "data" / "evol_products.json"))
+EVOL_CATALOG_CACHE = Path(os.environ.get("EVOL_CATALOG_CACHE", EVOL_CATALOG_PATH.with_suffix(".idx")))
+EVOL_CATALOG_CACHE_FORMAT = 2
+EVOL_INDEX_SETS = ("by_metal", "by_style", "by_occasion")
+
+_evol_index: Optional[EvolCatalogIndex] = None
+
+
+def compile_evol_catalog(path: Path) -> EvolCatalogIndex:
+    with open(path, encoding="utf-8") as f:
+        products = json.load(f)
+    for product in products:
+        product["id"] = stable_product_id(product)
+    return EvolCatalogIndex(products)
+
+
+def evol_index_to_json(index: EvolCatalogIndex, source_key: list) -> Dict[str, Any]:
+    custom = next((pos for pos, p in enumerate(index.products) if p is index.custom_option), None)
+    return {
+        "source": source_key,
+        "products": index.products,
+        "custom_position": custom,
+        **{name: {key: sorted(positions) for key, positions in getattr(index, name).items()} for name in EVOL_INDEX_SETS},
+        "sorted_prices": index.sorted_prices,
+        "sorted_positions": index.sorted_positions,
+    }
+
+
+def evol_index_from_json(data: Dict[str, Any]) -> EvolCatalogIndex:
+    index = EvolCatalogIndex.__new__(EvolCatalogIndex)
+    index.products = data["products"]
+    custom = data["custom_position"]
+    index.custom_option = index.products[custom] if custom is not None else None
+    for name in EVOL_INDEX_SETS:
+        setattr(index, name, {key: set(positions) for key, positions in data[name].items()})
+    index.sorted_prices = data["sorted_prices"]
+    index.sorted_positions = data["sorted_positions"]
+    return index
+
+
+def load_evol_catalog(path: Path = EVOL_CATALOG_PATH, cache: Path = EVOL_CATALOG_CACHE) -> EvolCatalogIndex:
+    """Load the compiled catalog snapshot, rebuilding it if the JSON changed.
+
+    The snapshot is plain JSON, so a tampered file can at worst give wrong
+    data, never run code.
+    """
+    stat = path.stat()
+    source_key = [EVOL_CATALOG_CACHE_FORMAT, stat.st_size, stat.st_mtime_ns]
+    try:
+        with open(cache, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["source"] == source_key:
+            return evol_index_from_json(cached)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable catalog snapshot {cache}: {e}")
+
+    index = compile_evol_catalog(path)
+    try:
+        tmp = cache.with_suffix(cache.suffix + f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(evol_index_to_json(index, source_key), f, ensure_ascii=False)
+        os.replace(tmp, cache)
+    except OSError as e:
+        logger.warning(f"Could not write catalog snapshot {cache}: {e}")
+    return index
+
+
+def get_evol_index() -> EvolCatalogIndex:
+    global _evol_index
+    if _evol_index is None:
+        _evol_index = load_evol_catalog()
+        logger.info(f"Loaded {len(_evol_index.products)} Evol products from {EVOL_CATALOG_PATH.name}")
+    return _evol_index
+
 # Update product filtering to use real data
 async def get_enhanced_recommendations(survey_data):
     style = survey_data.get("style", "Classic")
@@ -1537,35 +2284,22 @@ async def get_enhanced_recommendations(survey_data):
     # Parse budget range using the same logic as BUDGET_RANGES_INR
     budget_min, budget_max = BUDGET_RANGES_INR.get(budget, (25000, 65000))
     
-    # Filter products based on criteria including metal type
-    filtered_products = []
-    for product in EVOL_PRODUCTS:
-        # Skip custom option for regular filtering
-        if product.get("is_custom"):
-            continue
-        
-        # Check metal type match
-        metal_match = selected_metal in product.get("metal_types", [])
-        
-        # Apply filters: budget, metal, and (style OR occasion)
-        if (budget_min <= product["price"] <= budget_max and 
-            metal_match and
-            (style in product["style"] or occasion in product["occasion"])):
-            filtered_products.append(product)
+    index = get_evol_index()
+    # Budget and metal are hard filters
+    eligible = index.in_price_range(budget_min, budget_max) & index.by_metal.get(selected_metal, set())
+    # Prefer products matching style OR occasion, in catalog order
+    matched = eligible & (index.by_style.get(style, set()) | index.by_occasion.get(occasion, set()))
+    positions = sorted(matched)
     
     # If not enough products, relax style/occasion filter but keep metal filter
-    if len(filtered_products) < 4:
-        for product in EVOL_PRODUCTS:
-            if (not product.get("is_custom") and 
-                budget_min <= product["price"] <= budget_max and
-                selected_metal in product.get("metal_types", []) and
-                product not in filtered_products):
-                filtered_products.append(product)
-                if len(filtered_products) >= 4:
-                    break
+    if len(positions) < 4:
+        relaxed = sorted(eligible - matched)
+        positions.extend(relaxed[:4 - len(positions)])
+    
+    filtered_products = [index.products[pos] for pos in positions]
     
     # Always add custom option as the last item
-    custom_option = next((p for p in EVOL_PRODUCTS if p.get("is_custom")), None)
+    custom_option = index.custom_option
     if custom_option:
         filtered_products.append(custom_option)
     
@@ -1609,43 +2343,300 @@ async def get_enhanced_recommendations(survey_data):
     
     return recommendations
 
+def evol_to_product_doc(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an Evol catalog record to the db.products document shape."""
+    return {
+        "id": product["id"],
+        "name": product["name"],
+        "price": product["price"] / USD_TO_INR,  # Convert to USD for storage
+        "image_url": product["images"][0] if product["images"] else "",
+        "style_tags": product["style"],
+        "occasion_tags": product["occasion"],
+        "description": product["description"],
+        "category": product.get("category") or None,
+        "metal_types": product.get("metal_types", []),
+    }
+
+def product_content_hash(doc: Dict[str, Any]) -> str:
+    body = {k: v for k, v in doc.items() if k not in ("_id", "content_hash", "import_run")}
+    return hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+async def stored_product_hashes(scope: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    stored: Dict[str, Optional[str]] = {}
+    async for row in db.products.find(scope, {"_id": 0, "id": 1, "content_hash": 1}):
+        stored[row["id"]] = row.get("content_hash")
+    return stored
+
+
+def stale_product_ids(stored: Dict[str, Optional[str]], wanted: set) -> List[str]:
+    return [pid for pid in stored if pid not in wanted]
+
+
+async def sync_products(docs: List[Dict[str, Any]], scope: Dict[str, Any]) -> Dict[str, int]:
+    """Make the products matching `scope` equal to `docs` with one bulk_write.
+
+    Documents are keyed by id and compared by content hash, so only new or
+    changed products are written and only vanished ones are deleted.
+    """
+    for doc in docs:
+        doc["content_hash"] = product_content_hash(doc)
+    stored = await stored_product_hashes(scope)
+
+    ops: List[Any] = []
+    inserted = updated = 0
+    for doc in docs:
+        if doc["id"] not in stored:
+            inserted += 1
+        elif stored[doc["id"]] != doc["content_hash"]:
+            updated += 1
+        else:
+            continue
+        ops.append(ReplaceOne({"id": doc["id"]}, doc, upsert=True))
+    stale = stale_product_ids(stored, {doc["id"] for doc in docs})
+    if stale:
+        ops.append(DeleteMany({**scope, "id": {"$in": stale}}))
+    if ops:
+        await db.products.bulk_write(ops, ordered=False)
+    return {"inserted": inserted, "updated": updated, "deleted": len(stale), "unchanged": len(docs) - inserted - updated}
+
 @app.post("/api/admin/import-evol-products")
 async def import_evol_products():
     """Import real Evol Jewels product data"""
     try:
-        # Debug: Check how many products are in EVOL_PRODUCTS
-        logger.info(f"EVOL_PRODUCTS array contains {len(EVOL_PRODUCTS)} products")
-        
-        # Clear existing products
-        await db.products.delete_many({})
-        
-        # Transform and insert real Evol products
-        transformed_products = []
-        for product in EVOL_PRODUCTS:
-            transformed = {
-                "id": product["id"],
-                "name": product["name"],
-                "price": product["price"] / USD_TO_INR,  # Convert to USD for storage
-                "image_url": product["images"][0] if product["images"] else "",
-                "style_tags": product["style"],
-                "occasion_tags": product["occasion"],
-                "description": product["description"]
-            }
-            transformed_products.append(transformed)
+        evol_products = get_evol_index().products
+        logger.info(f"Evol catalog contains {len(evol_products)} products")
         
-        result = await db.products.insert_many(transformed_products)
+        # Transform and sync real Evol products; XLSX imports are left alone
+        transformed_products = [evol_to_product_doc(product) for product in evol_products]
+        stats = await sync_products(transformed_products, {"source": {"$ne": "xlsx"}})
         
-        logger.info(f"Imported {len(result.inserted_ids)} products to database")
+        logger.info(f"Synced {len(transformed_products)} products to database: {stats}")
+        if stats["inserted"] or stats["updated"] or stats["deleted"]:
+            await publish_catalog_change()
         
         return {
             "success": True,
-            "imported": len(result.inserted_ids),
+            "imported": len(transformed_products),
+            **stats,
             "message": "Successfully imported Evol Jewels product data"
         }
     except Exception as e:
         logger.error(f"Import error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ------------------ XLSX catalog import ------------------
+XLSX_BATCH_SIZE = int(os.environ.get("XLSX_BATCH_SIZE", "500"))
+
+# Normalized header text -> Evol catalog field
+XLSX_COLUMN_ALIASES: Dict[str, str] = {
+    "name": "name", "title": "name", "productname": "name", "product": "name",
+    "price": "price", "priceinr": "price", "mrp": "price", "sellingprice": "price",
+    "category": "category", "type": "category", "producttype": "category",
+    "metal": "metal_types", "metals": "metal_types", "metaltype": "metal_types", "metaltypes": "metal_types",
+    "karat": "karat_options", "karats": "karat_options", "purity": "karat_options", "karatoptions": "karat_options",
+    "size": "sizes", "sizes": "sizes",
+    "image": "images", "images": "images", "imageurl": "images", "imageurls": "images", "imagesrc": "images",
+    "url": "url", "link": "url", "producturl": "url",
+    "description": "description", "bodyhtml": "description",
+    "occasion": "occasion", "occasions": "occasion",
+    "style": "style", "styles": "style",
+    "celebrityvibe": "celebrity_vibe", "vibe": "celebrity_vibe",
+}
+XLSX_LIST_FIELDS = ("metal_types", "karat_options", "sizes", "images", "occasion", "style")
+# EVOL fields stored on the product document next to the Product fields
+XLSX_EXTRA_FIELDS = ("category", "metal_types", "karat_options", "sizes", "images", "url", "celebrity_vibe")
+
+
+def _normalize_header(value: Any) -> str:
+    return "".join(ch for ch in str(value or "").lower() if ch.isalnum())
+
+
+def resolve_xlsx_path(url: str) -> Path:
+    """Accept a local path or a file:// URL; remote URLs are rejected."""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        path = Path(unquote(parsed.path))
+    elif len(parsed.scheme) > 1:  # a one-letter scheme is a Windows drive
+        raise HTTPException(status_code=400, detail="Only local paths and file:// URLs are supported")
+    else:
+        path = Path(url)
+    if not path.is_file():
+        raise HTTPException(status_code=400, detail=f"Workbook not found: {path}")
+    return path
+
+
+def detect_xlsx_columns(header: tuple, mapping: Optional[Dict[str, str]], auto_detect: bool) -> Dict[str, int]:
+    """Return EVOL field -> column index. Explicit mapping (field -> header) wins over auto-detection."""
+    positions = {_normalize_header(h): i for i, h in enumerate(header) if h is not None}
+    columns: Dict[str, int] = {}
+    if auto_detect:
+        for norm, i in positions.items():
+            field = XLSX_COLUMN_ALIASES.get(norm)
+            if field and field not in columns:
+                columns[field] = i
+    for field, column in (mapping or {}).items():
+        i = positions.get(_normalize_header(column))
+        if i is None:
+            raise HTTPException(status_code=400, detail=f"Column '{column}' not found for field '{field}'")
+        columns[field] = i
+    missing = [f for f in ("name", "price") if f not in columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Could not find columns for: {', '.join(missing)}")
+    return columns
+
+
+def _split_cell(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, (int, float)):
+        return [int(value) if float(value).is_integer() else value]
+    parts = [p.strip() for p in str(value).replace("|", ",").replace(";", ",").replace("\n", ",").split(",")]
+    return [int(p) if p.isdigit() else p for p in parts if p]
+
+
+XLSX_PRICE_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def _parse_price(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    # The first number in the cell, so prefixes like "Rs." or "INR" are ignored
+    match = XLSX_PRICE_PATTERN.search(str(value or ""))
+    if match is None:
+        return None
+    return float(match.group(0).replace(",", ""))
+
+
+def xlsx_row_to_evol(row: tuple, columns: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """Build an Evol catalog record from a sheet row, or None if unusable."""
+    def cell(field: str) -> Any:
+        i = columns.get(field)
+        return row[i] if i is not None and i < len(row) else None
+
+    name = str(cell("name") or "").strip()
+    price = _parse_price(cell("price"))
+    if not name or price is None:
+        return None
+    product: Dict[str, Any] = {
+        "name": name,
+        "price": price,
+        "category": str(cell("category") or "").strip(),
+        "url": str(cell("url") or "").strip(),
+        "description": str(cell("description") or "").strip() or f"{name} - Evol Jewels",
+        "celebrity_vibe": str(cell("celebrity_vibe") or "").strip() or "Everyday Chic",
+    }
+    for field in XLSX_LIST_FIELDS:
+        values = _split_cell(cell(field))
+        # sizes stay numeric where possible, like the Evol catalog data
+        product[field] = values if field == "sizes" else [str(v) for v in values]
+    product["id"] = stable_product_id(product, source="xlsx")
+    return product
+
+
+def iter_xlsx_rows(path: Path):
+    """Yield sheet rows as value tuples from the first worksheet, in read-only mode."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+@app.post("/api/admin/import-xlsx")
+async def import_xlsx_products(payload: ImportXlsxRequest):
+    """Stream a product workbook into db.products in bounded batches"""
+    if load_workbook is None:
+        raise HTTPException(status_code=503, detail="openpyxl is not installed")
+    if not payload.auto_detect and not payload.mapping:
+        raise HTTPException(status_code=400, detail="Provide a column mapping or enable auto_detect")
+    path = resolve_xlsx_path(payload.url)
+    rows = iter_xlsx_rows(path)
+
+    # openpyxl parsing is blocking, so each batch is read in a worker thread
+    def next_batch(size: int) -> List[tuple]:
+        return list(islice(rows, size))
+
+    imported = skipped = unchanged = deleted = 0
+    # Every row this import sees is stamped with its run id, so replace can
+    # delete the rest without holding the sheet's ids in memory
+    run = uuid.uuid4().hex
+    changed = False
+    try:
+        header: Optional[tuple] = None
+        while header is None:
+            first = await asyncio.to_thread(next_batch, 1)
+            if not first:
+                raise HTTPException(status_code=400, detail="Workbook is empty")
+            if any(v is not None for v in first[0]):
+                header = first[0]
+        columns = detect_xlsx_columns(header, payload.mapping, payload.auto_detect)
+
+        while True:
+            batch = await asyncio.to_thread(next_batch, XLSX_BATCH_SIZE)
+            if not batch:
+                break
+            docs = []
+            for row in batch:
+                if all(v is None for v in row):
+                    continue
+                product = xlsx_row_to_evol(row, columns)
+                if product is None:
+                    skipped += 1
+                    continue
+                doc = evol_to_product_doc(product)
+                doc.update({field: product[field] for field in XLSX_EXTRA_FIELDS})
+                doc["source"] = "xlsx"
+                doc["content_hash"] = product_content_hash(doc)
+                doc["import_run"] = run
+                docs.append(doc)
+            if not docs:
+                continue
+            stored = await stored_product_hashes({"id": {"$in": [doc["id"] for doc in docs]}})
+            ops: List[Any] = []
+            stamps: List[Any] = []
+            for doc in docs:
+                if stored.get(doc["id"]) == doc["content_hash"]:
+                    unchanged += 1
+                    if payload.replace:
+                        stamps.append(UpdateOne({"id": doc["id"]}, {"$set": {"import_run": run}}))
+                    continue
+                ops.append(ReplaceOne({"id": doc["id"]}, doc, upsert=True))
+            if ops or stamps:
+                await db.products.bulk_write(ops + stamps, ordered=False)
+            if ops:
+                changed = True
+                imported += len(ops)
+
+        if payload.replace:
+            # Only after the whole sheet is stored, so a failed import keeps the previous rows
+            result = await db.products.delete_many({"source": "xlsx", "import_run": {"$ne": run}})
+            deleted = result.deleted_count
+            changed = changed or deleted > 0
+    except BaseException:
+        if changed:
+            # Rows written before the failure are in Mongo too, so the snapshot must follow
+            try:
+                await publish_catalog_change()
+            except Exception as e:
+                logger.error(f"Catalog refresh after failed XLSX import failed: {e}")
+        raise
+    finally:
+        rows.close()
+    if changed:
+        await publish_catalog_change()
+
+    logger.info(f"Imported {imported} products from {path.name} ({skipped} rows skipped, {unchanged} unchanged, {deleted} deleted)")
+    return {
+        "success": True,
+        "imported": imported,
+        "unchanged": unchanged,
+        "deleted": deleted,
+        "skipped": skipped,
+        "columns": {field: header[i] for field, i in columns.items()},
+        "message": f"Successfully imported products from {path.name}"
+    }
+
 @app.get("/api/celebrity-styles")
 async def get_celebrity_styles():
     """Get celebrity style database"""
@@ -1676,8 +2667,7 @@ async def test_groq():
         if not groq_key:
             return {"status": "error", "message": "No GROQ_API_KEY found"}
         
-        from groq import AsyncGroq
-        client = AsyncGroq(api_key=groq_key)
+        client = get_llm_client("groq")
         
         response = await client.chat.completions.create(
             model="llama-3.3-70b-versatile",
@@ -1695,148 +2685,383 @@ async def test_groq():
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+chat_flights = SingleFlight()
+
+
+def chat_request_key(request: ChatRequest) -> str:
+    body = json.dumps(request.model_dump(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
 @app.post("/api/chat")
 async def chat_with_ai(request: ChatRequest):
     """Natural conversational AI chat for jewelry styling"""
+    # Identical concurrent conversations share one provider call
+    return await chat_flights.do(chat_request_key(request), lambda: generate_chat_reply(request))
+
+
+STYLIST_SYSTEM_PROMPT = "You are a professional luxury jewelry stylist for Evol Jewels. Speak warmly and naturally like a real stylist would - conversational, friendly, and knowledgeable. Keep responses concise (2-3 sentences max). Use casual language and show genuine excitement about jewelry. Add relevant emojis occasionally to feel more human. If asked about purchasing, mention they'll get a QR code at the end to shop easily."
+
+
+CHAT_PROMPT_TOKEN_BUDGET = int(os.environ.get("CHAT_PROMPT_TOKEN_BUDGET", "1500"))
+CHAT_MAX_TURNS = int(os.environ.get("CHAT_MAX_TURNS", "12"))
+CHAT_SUMMARY_MAX_CHARS = int(os.environ.get("CHAT_SUMMARY_MAX_CHARS", "300"))
+CHAT_SUMMARY_PREFIX = "\n\nEarlier in this conversation the shopper said: "
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English chat text
+    return len(text) // 4 + 1
+
+
+def message_tokens(role: str, content: str) -> int:
+    return estimate_tokens(content) + 4  # per-message framing overhead
+
+
+def shorten_at_boundary(text: str, limit: int) -> str:
+    """Cut text to at most limit characters at a sentence end, else at a word break."""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if sentence_end >= limit // 2:
+        return cut[:sentence_end + 1]
+    cut = text[:limit - 1]
+    space = cut.rfind(" ")
+    if space > 0:
+        cut = cut[:space].rstrip(" ,;:")
+    return cut + "…"
+
+
+def summarize_statements(said: List[str], limit: int) -> str:
+    """Join the newest statements that fit in limit characters, oldest first.
+
+    Earlier statements are dropped whole; only a newest statement that is
+    longer than limit on its own is shortened.
+    """
+    kept: List[str] = []
+    used = 0
+    for text in reversed(said):
+        cost = len(text) + (2 if kept else 0)  # "; " separator
+        if used + cost > limit:
+            break
+        kept.append(text)
+        used += cost
+    if not kept:
+        return shorten_at_boundary(said[-1], limit)
+    return "; ".join(reversed(kept))
+
+
+def budget_chat_request(request: ChatRequest) -> tuple:
+    """Fit a chat request into the prompt token budget.
+
+    Returns (budgeted request, token stats). The budgeted request has exactly
+    one system message: the client's own system prompts, deduplicated, or the
+    stylist persona when the client sent none. It then carries the newest
+    turns that fit CHAT_PROMPT_TOKEN_BUDGET and CHAT_MAX_TURNS; the latest
+    turn is always kept. What the shopper said in dropped turns is folded
+    into the system message as a short note.
+    """
+    system_parts: List[str] = []
+    for msg in request.messages:
+        if msg.role == "system" and msg.content not in system_parts:
+            system_parts.append(msg.content)
+    system = "\n\n".join(system_parts) if system_parts else STYLIST_SYSTEM_PROMPT
+    turns = [msg for msg in request.messages if msg.role != "system"]
+
+    remaining = CHAT_PROMPT_TOKEN_BUDGET - message_tokens("system", system)
+    if len(turns) > CHAT_MAX_TURNS or sum(message_tokens(m.role, m.content) for m in turns) > remaining:
+        # Turns will be dropped, so keep room for the note that summarizes them
+        remaining -= (len(CHAT_SUMMARY_PREFIX) + CHAT_SUMMARY_MAX_CHARS) // 4 + 1
+    kept: List[ChatMessage] = []
+    for msg in reversed(turns):
+        cost = message_tokens(msg.role, msg.content)
+        if kept and (len(kept) >= CHAT_MAX_TURNS or cost > remaining):
+            break
+        kept.append(msg)
+        remaining -= cost
+    kept.reverse()
+
+    dropped = turns[:len(turns) - len(kept)]
+    said = [msg.content.strip() for msg in dropped if msg.role == "user" and msg.content.strip()]
+    if said:
+        system += CHAT_SUMMARY_PREFIX + summarize_statements(said, CHAT_SUMMARY_MAX_CHARS)
+
+    messages = [ChatMessage(role="system", content=system)] + kept
+    # Before budgeting every provider got the persona prompt on top of the full history
+    original = message_tokens("system", STYLIST_SYSTEM_PROMPT) + sum(message_tokens(m.role, m.content) for m in request.messages)
+    sent = sum(message_tokens(m.role, m.content) for m in messages)
+    stats = {
+        "prompt_tokens": sent,
+        "tokens_saved": max(original - sent, 0),
+        "turns_dropped": len(dropped),
+    }
+    budgeted = ChatRequest(messages=messages, temperature=request.temperature, max_tokens=request.max_tokens)
+    return budgeted, stats
+
+
+def chat_messages(request: ChatRequest) -> List[Dict[str, str]]:
+    return [{"role": msg.role, "content": msg.content} for msg in request.messages]
+
+
+CHAT_MODELS = {
+    "groq": "llama-3.3-70b-versatile",
+    "xai": "grok-beta",
+    "openai": "gpt-4o-mini",
+    "emergent": "emergent",
+}
+
+
+async def chat_via_groq(request: ChatRequest) -> str:
+    response = await get_llm_client("groq").chat.completions.create(
+        model=CHAT_MODELS["groq"],
+        messages=chat_messages(request),
+        temperature=request.temperature,
+        max_tokens=request.max_tokens
+    )
+    return response.choices[0].message.content
+
+
+async def chat_via_xai(request: ChatRequest) -> str:
+    response = await get_llm_client("xai").chat.completions.create(
+        model=CHAT_MODELS["xai"],
+        messages=chat_messages(request),
+        temperature=request.temperature,
+        max_tokens=request.max_tokens
+    )
+    return response.choices[0].message.content
+
+
+async def chat_via_openai(request: ChatRequest) -> str:
+    response = await get_llm_client("openai").chat.completions.create(
+        model=CHAT_MODELS["openai"],
+        messages=chat_messages(request),
+        temperature=request.temperature,
+        max_tokens=request.max_tokens
+    )
+    return response.choices[0].message.content
+
+
+async def chat_via_emergent(request: ChatRequest) -> str:
+    from emergentintegrations.llm import EmergentLLM
+    llm = EmergentLLM(api_key=os.environ["EMERGENT_LLM_KEY"])
+    # Use the conversation context
+    conversation = "\n".join([f"{msg.role}: {msg.content}" for msg in request.messages])
+    return await llm.acomplete(conversation)
+
+
+async def stream_completion(provider: str, model: str, messages: List[Dict[str, str]], request: ChatRequest) -> AsyncIterator[str]:
+    """Yield content deltas from an OpenAI-compatible streaming completion."""
+    # The call slot is held until the stream is fully consumed or closed
+    async with llm_slot(provider):
+        stream = await get_llm_client(provider).chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def stream_via_groq(request: ChatRequest) -> AsyncIterator[str]:
+    return stream_completion("groq", CHAT_MODELS["groq"], chat_messages(request), request)
+
+
+def stream_via_xai(request: ChatRequest) -> AsyncIterator[str]:
+    return stream_completion("xai", CHAT_MODELS["xai"], chat_messages(request), request)
+
+
+def stream_via_openai(request: ChatRequest) -> AsyncIterator[str]:
+    return stream_completion("openai", CHAT_MODELS["openai"], chat_messages(request), request)
+
+
+async def stream_via_emergent(request: ChatRequest) -> AsyncIterator[str]:
+    # No streaming API; the whole reply arrives as one chunk
+    async with llm_slot("emergent"):
+        yield await chat_via_emergent(request)
+
+
+class ChatProvider:
+    def __init__(
+        self,
+        name: str,
+        source: str,
+        timeout: float,
+        call: Callable[[ChatRequest], Awaitable[str]],
+        stream: Callable[[ChatRequest], AsyncIterator[str]],
+        configured: Callable[[], bool],
+    ):
+        self.name = name
+        self.source = source  # value reported in the response "source" field
+        self.timeout = timeout  # for the full reply, or the first token when streaming
+        self.call = call
+        self.stream = stream
+        self.configured = configured
+
+
+# Default order when providers are equally healthy
+CHAT_PROVIDERS: List[ChatProvider] = [
+    ChatProvider("groq", "groq", 15.0, chat_via_groq, stream_via_groq, lambda: get_llm_client("groq") is not None),
+    ChatProvider("xai", "grok", 20.0, chat_via_xai, stream_via_xai, lambda: get_llm_client("xai") is not None),
+    ChatProvider("openai", "openai", 15.0, chat_via_openai, stream_via_openai, lambda: get_llm_client("openai") is not None),
+    ChatProvider("emergent", "emergent", 15.0, chat_via_emergent, stream_via_emergent, lambda: bool(os.environ.get("EMERGENT_LLM_KEY"))),
+]
+
+CHAT_HEALTH_WINDOW = int(os.environ.get("CHAT_HEALTH_WINDOW", "20"))
+CHAT_CIRCUIT_FAILURES = int(os.environ.get("CHAT_CIRCUIT_FAILURES", "3"))
+CHAT_CIRCUIT_COOLDOWN = float(os.environ.get("CHAT_CIRCUIT_COOLDOWN_SECONDS", "30"))
+# Older results stop counting, so a provider that failed once is tried first again later
+CHAT_HEALTH_MAX_AGE = float(os.environ.get("CHAT_HEALTH_MAX_AGE_SECONDS", "300"))
+CHAT_HEALTHY_SUCCESS_RATE = 0.8
+# Fewer recent samples than this say too little to demote a provider on success rate
+CHAT_HEALTH_MIN_SAMPLES = int(os.environ.get("CHAT_HEALTH_MIN_SAMPLES", "5"))
+CIRCUIT_STATE_RANK = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class ProviderHealth:
+    """Rolling success/latency stats and a circuit breaker for one provider.
+
+    closed: calls go through. open: calls are skipped until the cooldown
+    passes. half_open: a single probe call decides whether to close again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.results: "deque[tuple]" = deque(maxlen=CHAT_HEALTH_WINDOW)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def acquire(self) -> bool:
+        """Whether a call may be made now; takes the probe slot when half open."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < CHAT_CIRCUIT_COOLDOWN:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record(self, ok: bool, latency: float) -> None:
+        self.results.append((time.monotonic(), ok, latency))
+        self.probe_in_flight = False
+        if ok:
+            self.consecutive_failures = 0
+            self.state = "closed"
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= CHAT_CIRCUIT_FAILURES:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def recent(self) -> List[tuple]:
+        cutoff = time.monotonic() - CHAT_HEALTH_MAX_AGE
+        while self.results and self.results[0][0] < cutoff:
+            self.results.popleft()
+        return list(self.results)
+
+    def success_rate(self) -> float:
+        recent = self.recent()
+        if not recent:
+            return 1.0
+        return sum(1 for _, ok, _ in recent if ok) / len(recent)
+
+    def mean_latency(self) -> Optional[float]:
+        latencies = [lat for _, ok, lat in self.recent() if ok]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def rank(self) -> tuple:
+        """Sort key: circuit state first, then how far below healthy the success rate is.
+
+        A demoted provider gets no new samples, so one early failure would
+        otherwise keep it behind the others until the sample ages out.
+        """
+        recent = self.recent()
+        rate = sum(1 for _, ok, _ in recent if ok) / len(recent) if recent else 1.0
+        penalty = 0.0 if len(recent) < CHAT_HEALTH_MIN_SAMPLES or rate >= CHAT_HEALTHY_SUCCESS_RATE else 1.0 - rate
+        return (CIRCUIT_STATE_RANK[self.state], penalty)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latency = self.mean_latency()
+        return {
+            "state": self.state,
+            "success_rate": round(self.success_rate(), 3),
+            "mean_latency_ms": round(latency * 1000, 1) if latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "samples": len(self.recent()),
+        }
+
+
+class ProviderRouter:
+    def __init__(self, providers: List[ChatProvider]):
+        self.providers = providers
+        self.health = {p.name: ProviderHealth(p.name) for p in providers}
+
+    def ranked(self) -> List[ChatProvider]:
+        """Configured providers, healthiest first; default order breaks ties."""
+        configured = [p for p in self.providers if p.configured()]
+        return sorted(configured, key=lambda p: self.health[p.name].rank())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "order": [p.name for p in self.ranked()],
+            "providers": {
+                p.name: {"configured": p.configured(), **self.health[p.name].snapshot()}
+                for p in self.providers
+            },
+        }
+
+
+chat_router = ProviderRouter(CHAT_PROVIDERS)
+
+
+async def generate_chat_reply(request: ChatRequest):
     logger.info(f"=== Chat endpoint called with {len(request.messages)} messages ===")
     
     try:
-        # Try Groq first (ultra-fast inference)
-        groq_key = os.environ.get("GROQ_API_KEY")
-        logger.info(f"GROQ_API_KEY present: {bool(groq_key)}")
-        
-        if groq_key:
-            logger.info("Attempting Groq API call...")
-            try:
-                from groq import AsyncGroq
-                logger.info("AsyncGroq imported successfully")
-                
-                client = AsyncGroq(api_key=groq_key)
-                logger.info("Groq client created")
-                
-                # Add system message for jewelry stylist persona
-                messages = [
-                    {
-                        "role": "system", 
-                        "content": "You are a professional luxury jewelry stylist for Evol Jewels. Speak warmly and naturally like a real stylist would - conversational, friendly, and knowledgeable. Keep responses concise (2-3 sentences max). Use casual language and show genuine excitement about jewelry. Add relevant emojis occasionally to feel more human. If asked about purchasing, mention they'll get a QR code at the end to shop easily."
-                    }
-                ]
-                
-                # Add conversation history
-                for msg in request.messages:
-                    messages.append({"role": msg.role, "content": msg.content})
-                
-                logger.info(f"Calling Groq with {len(messages)} messages...")
-                response = await asyncio.wait_for(
-                    client.chat.completions.create(
-                        model="llama-3.3-70b-versatile",
-                        messages=messages,
-                        temperature=request.temperature,
-                        max_tokens=request.max_tokens
-                    ),
-                    timeout=15.0
-                )
-                
-                ai_response = response.choices[0].message.content
-                logger.info(f"✅ Groq AI response generated: {ai_response[:50]}...")
-                return {"response": ai_response, "source": "groq", "timestamp": datetime.now().isoformat()}
-                
-            except Exception as groq_error:
-                logger.error(f"❌ Groq AI chat failed: {type(groq_error).__name__}: {str(groq_error)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-        else:
-            logger.warning("No GROQ_API_KEY found in environment")
-        
-        # Try xAI Grok as fallback
-        logger.info("Trying xAI Grok fallback...")
-        xai_key = os.environ.get("XAI_API_KEY")
-        if xai_key and AsyncOpenAI is not None:
-            try:
-                # Use OpenAI client with xAI base URL
-                client = AsyncOpenAI(
-                    api_key=xai_key,
-                    base_url="https://api.x.ai/v1"
-                )
-                
-                # Add system message for jewelry stylist persona
-                messages = [
-                    {
-                        "role": "system", 
-                        "content": "You are a professional luxury jewelry stylist for Evol Jewels. Speak warmly and naturally like a real stylist would - conversational, friendly, and knowledgeable. Keep responses concise (2-3 sentences max). Use casual language and show genuine excitement about jewelry. Add relevant emojis occasionally to feel more human. If asked about purchasing, mention they'll get a QR code at the end to shop easily."
-                    }
-                ]
-                
-                # Add conversation history
-                for msg in request.messages:
-                    messages.append({"role": msg.role, "content": msg.content})
-                
-                response = await asyncio.wait_for(
-                    client.chat.completions.create(
-                        model="grok-beta",
-                        messages=messages,
-                        temperature=request.temperature,
-                        max_tokens=request.max_tokens
-                    ),
-                    timeout=20.0
-                )
-                
-                ai_response = response.choices[0].message.content
-                logger.info("Grok AI stylist response generated successfully")
-                return {"response": ai_response, "source": "grok"}
-                
-            except Exception as grok_error:
-                logger.warning(f"Grok AI chat failed: {grok_error}")
-        
-        # Try OpenAI as fallback
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if api_key and AsyncOpenAI is not None:
+        budgeted, budget = budget_chat_request(request)
+        logger.info(f"Chat prompt budget: {budget}")
+        for provider in chat_router.ranked():
+            health = chat_router.health[provider.name]
+            if not health.acquire():
+                logger.info(f"Skipping {provider.name}: circuit {health.state}")
+                continue
+            started = time.monotonic()
             try:
-                client = AsyncOpenAI(api_key=api_key)
-                
-                # Convert messages to OpenAI format
-                openai_messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-                
-                response = await asyncio.wait_for(
-                    client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=openai_messages,
-                        temperature=request.temperature,
-                        max_tokens=request.max_tokens
-                    ),
-                    timeout=15.0
-                )
-                
-                ai_response = response.choices[0].message.content
-                return {"response": ai_response, "source": "openai"}
-                
-            except Exception as openai_error:
-                logger.warning(f"OpenAI chat failed: {openai_error}")
-        
-        # Try Emergent LLM key as fallback
-        try:
-            from emergentintegrations.llm import EmergentLLM
-            
-            emergent_key = os.environ.get("EMERGENT_LLM_KEY")
-            if emergent_key:
-                llm = EmergentLLM(api_key=emergent_key)
-                
-                # Use the conversation context
-                conversation = "\n".join([f"{msg.role}: {msg.content}" for msg in request.messages])
-                
-                response = await asyncio.wait_for(
-                    llm.acomplete(conversation),
-                    timeout=15.0
-                )
-                
-                return {"response": response, "source": "emergent"}
-                
-        except Exception as emergent_error:
-            logger.warning(f"Emergent LLM chat failed: {emergent_error}")
+                async with llm_slot(provider.name):
+                    started = time.monotonic()
+                    with llm_call_metrics(provider.name, CHAT_MODELS[provider.name]):
+                        ai_response = await asyncio.wait_for(provider.call(budgeted), timeout=provider.timeout)
+            except (asyncio.CancelledError, LLMQueueFull) as e:
+                health.probe_in_flight = False
+                if isinstance(e, LLMQueueFull):
+                    # Saturated: answer from the fallback instead of piling onto other providers
+                    logger.warning(f"Chat skipped LLM providers: {e}")
+                    break
+                raise
+            except Exception as provider_error:
+                health.record(False, time.monotonic() - started)
+                logger.warning(f"{provider.name} chat failed: {type(provider_error).__name__}: {provider_error}")
+                continue
+            health.record(True, time.monotonic() - started)
+            logger.info(f"✅ {provider.name} response generated: {(ai_response or '')[:50]}...")
+            return {
+                "response": ai_response,
+                "source": provider.source,
+                "timestamp": datetime.now().isoformat(),
+                "tokens_saved": budget["tokens_saved"],
+            }
         
         # Intelligent fallback based on the user's question
         user_message = request.messages[-1].content if request.messages else ""
         fallback_response = generate_intelligent_fallback(user_message)
+        LLM_FALLBACKS.labels("chat").inc()
         
         return {"response": fallback_response, "source": "fallback"}
         
@@ -1844,6 +3069,107 @@ async def chat_with_ai(request: ChatRequest):
         logger.error(f"Chat endpoint error: {e}")
         return {"response": "I'm here to help you find the perfect jewelry! What would you like to know?", "source": "error"}
 
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_chat_reply(request: ChatRequest) -> AsyncIterator[str]:
+    """SSE body for /api/chat/stream: token deltas, then a final 'done' event.
+
+    Providers are tried in router order until one produces its first token
+    within its timeout; after that the stream is committed to that provider.
+    """
+    logger.info(f"=== Chat stream called with {len(request.messages)} messages ===")
+    budgeted, budget = budget_chat_request(request)
+    logger.info(f"Chat prompt budget: {budget}")
+    for provider in chat_router.ranked():
+        health = chat_router.health[provider.name]
+        if not health.acquire():
+            continue
+        started = time.monotonic()
+        chunks = provider.stream(budgeted)
+        # Closing the provider stream releases its llm_slot on every exit path,
+        # including a client disconnect or a cancelled first-token wait
+        try:
+            try:
+                with llm_call_metrics(provider.name, CHAT_MODELS[provider.name]):
+                    first = await asyncio.wait_for(chunks.__anext__(), timeout=provider.timeout)
+            except StopAsyncIteration:
+                first = ""
+            except asyncio.CancelledError:
+                health.probe_in_flight = False
+                raise
+            except LLMQueueFull as e:
+                health.probe_in_flight = False
+                logger.warning(f"Chat stream skipped LLM providers: {e}")
+                break
+            except Exception as provider_error:
+                health.record(False, time.monotonic() - started)
+                logger.warning(f"{provider.name} chat stream failed: {type(provider_error).__name__}: {provider_error}")
+                continue
+            if not first:
+                # Ending without a token is a failed attempt; the next provider answers
+                health.record(False, time.monotonic() - started)
+                logger.warning(f"{provider.name} chat stream ended without a token")
+                continue
+            # Health latency for streams is time to first token
+            health.record(True, time.monotonic() - started)
+            parts = [first]
+            yield sse_event({"delta": first})
+            complete = True
+            try:
+                async for piece in chunks:
+                    parts.append(piece)
+                    yield sse_event({"delta": piece})
+            except Exception as stream_error:
+                complete = False
+                logger.warning(f"{provider.name} chat stream broke off: {stream_error}")
+            yield sse_event({
+                "response": "".join(parts),
+                "source": provider.source,
+                "complete": complete,
+                "timestamp": datetime.now().isoformat(),
+                "tokens_saved": budget["tokens_saved"],
+            }, event="done")
+            return
+        finally:
+            await chunks.aclose()
+
+    # Intelligent fallback based on the user's question
+    user_message = request.messages[-1].content if request.messages else ""
+    fallback_response = generate_intelligent_fallback(user_message)
+    LLM_FALLBACKS.labels("chat_stream").inc()
+    yield sse_event({"delta": fallback_response})
+    yield sse_event({"response": fallback_response, "source": "fallback", "complete": True}, event="done")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Streaming variant of /api/chat using Server-Sent Events"""
+    return StreamingResponse(
+        stream_chat_reply(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/llm/limits")
+async def llm_limits():
+    """Outbound LLM concurrency: in-flight calls, queue depth and wait times"""
+    return {
+        "queue_timeout_seconds": LLM_QUEUE_TIMEOUT,
+        "global": llm_global_limiter.stats(),
+        "providers": {name: limiter.stats() for name, limiter in llm_provider_limiters.items()},
+    }
+
+
+@app.get("/api/chat/providers")
+async def chat_provider_health():
+    """Provider router state: circuit, success rate and latency per provider"""
+    return chat_router.snapshot()
+
 def generate_intelligent_fallback(user_input):
     """Generate contextual fallback responses"""
     input_lower = user_input.lower()
@@ -1873,6 +3199,15 @@ def generate_intelligent_fallback(user_input):
 
 @app.on_event("startup")
 async def on_startup():
+    global _vibe_warmup_task, _loop_lag_task
+    init_llm_clients()
+    session_writer.start()
+    await ensure_indexes()
+    if SESSION_RETENTION_DAYS > 0:
+        try:
+            await backfill_session_timestamps()
+        except Exception as e:
+            logger.error(f"Session created_ts backfill failed: {e}")
     await seed_products_if_needed()
     # Auto-import Evol products on startup
     try:
@@ -1880,7 +3215,24 @@ async def on_startup():
         logger.info("Evol Jewels products imported successfully")
     except Exception as e:
         logger.error(f"Failed to import Evol products: {e}")
+    # The import refreshes the snapshot itself; load it here if that failed
+    try:
+        await ensure_catalog()
+    except Exception as e:
+        logger.error(f"Failed to load catalog snapshot: {e}")
+    if VIBE_WARMUP:
+        _vibe_warmup_task = asyncio.create_task(vibe_warmup_loop())
+    _loop_lag_task = asyncio.create_task(event_loop_lag_monitor())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if _vibe_warmup_task is not None:
+        _vibe_warmup_task.cancel()
+    if _loop_lag_task is not None:
+        _loop_lag_task.cancel()
+    await session_writer.close()
+    await close_llm_clients()
     client.close()
+    if METRICS_MULTIPROC_DIR and prometheus_client is not None:
+        # Drops this worker's live gauges from the aggregated view
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark FastAPI's default response serialization against FastJSONResponse in backend/server.py.
+Uses the full Evol catalog for /api/products and a built survey response for /api/survey.
+Reports time per response and peak memory allocated (tracemalloc) while building one response.
+"""
+
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "bench")
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+
+import server  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+
+def default_path(field, content):
+    """What FastAPI does for a route that returns models under a response_model."""
+    coro = serialize_response(field=field, response_content=content, is_coroutine=True)
+    # Never suspends for coroutine routes; drive it directly to keep event loop cost out of the timing
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return JSONResponse(content=done.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def fast_path(content):
+    return server.FastJSONResponse(content=content).body
+
+
+def measure(fn, n: int):
+    fn()  # warm-up
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95)], peak
+
+
+def report(title: str, cases, n: int):
+    print(title)
+    results = {}
+    for label, fn in cases:
+        results[label] = measure(fn, n)
+        mean, p95, peak = results[label]
+        print(f"  {label:28s} mean {mean:8.3f} ms   p95 {p95:8.3f} ms   peak alloc {peak / 1024:8.1f} KiB")
+    (base, _, base_peak), (fast, _, fast_peak) = results.values()
+    print(f"  speed-up x{base / fast:.1f}, allocations x{base_peak / max(fast_peak, 1):.1f} lower")
+
+
+def main(n: int):
+    index = server.compile_evol_catalog(server.EVOL_CATALOG_PATH)
+    items = [server.evol_to_product_doc(p) for p in index.products]
+    # /api/products: before, models were built and revalidated; now the snapshot dicts are encoded as-is
+    products: List[server.Product] = [server.Product(**it) for it in items]
+    projected = [{f: it.get(f, server.PRODUCT_FIELD_DEFAULTS[f]) for f in server.PRODUCT_FIELD_DEFAULTS} for it in items]
+    products_field = create_response_field(name="products", type_=List[server.Product])
+    report(
+        f"/api/products, {len(items)} products, {n} runs",
+        [
+            ("default (validate + encoder)", lambda: default_path(products_field, [server.Product(**it) for it in items])),
+            ("FastJSONResponse", lambda: fast_path(projected)),
+        ],
+        n,
+    )
+
+    recs = [server.RecommendationItem(product=p, reason="within your budget at ₹19,491") for p in products[:4]]
+    survey = server.RecommendationResponse(
+        session_id="bench",
+        engine="ai",
+        vibe="Everyday Chic",
+        explanation="Bench.",
+        moodboard_image=server.VIBE_IMAGES["Everyday Chic"],
+        recommendations=recs,
+        created_at=server.now_iso(),
+    )
+    survey_field = create_response_field(name="survey", type_=server.RecommendationResponse)
+    report(
+        f"/api/survey, {len(recs)} recommendations, {n} runs",
+        [
+            ("default (validate + encoder)", lambda: default_path(survey_field, survey)),
+            ("FastJSONResponse", lambda: fast_path(survey)),
+        ],
+        n,
+    )
+    print(f"orjson: {'enabled' if server.orjson is not None else 'not installed, stdlib fallback'}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request LLM clients against the shared pooled clients in backend/server.py.
+Runs a local stub of the chat completions API, so no API key or network access is needed.
+Loopback has no TLS, so real savings against a provider are larger than shown here.
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "{\"vibe\": \"Editorial Chic\", \"explanation\": \"Bench.\"}"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Avoid Nagle/delayed-ACK stalls on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub() -> str:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}/v1"
+
+
+async def call(client):
+    await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "Occasion: Wedding"}],
+        max_tokens=220,
+    )
+
+
+async def run(n: int):
+    base_url = start_stub()
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "bench")
+    sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+    import server
+    from openai import AsyncOpenAI
+
+    async def per_request():
+        client = AsyncOpenAI(api_key="bench", base_url=base_url)
+        await call(client)
+        await client.close()
+
+    async def shared():
+        await call(server.get_llm_client("openai"))
+
+    results = {}
+    for label, fn in (("new client per request", per_request), ("shared pooled client", shared)):
+        await fn()  # warm-up
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            await fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[label] = samples
+    await server.close_llm_clients()
+
+    print(f"{n} sequential chat.completions calls against {base_url}")
+    for label, samples in results.items():
+        samples.sort()
+        print(f"  {label:24s} mean {statistics.mean(samples):7.3f} ms   p50 {samples[len(samples) // 2]:7.3f} ms   p95 {samples[int(len(samples) * 0.95)]:7.3f} ms")
+    saved = statistics.mean(results["new client per request"]) - statistics.mean(results["shared pooled client"])
+    print(f"  saved per request: {saved:.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,11 @@
+"""
+Shared test setup: server.py reads its Mongo settings at import time and lives in backend/.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,79 @@
+"""
+Checks how budget_chat_request fits a conversation into the prompt token budget.
+"""
+
+import server
+from server import STYLIST_SYSTEM_PROMPT, ChatMessage, ChatRequest, budget_chat_request, message_tokens
+
+NOTE = "Earlier in this conversation the shopper said: "
+
+
+def chat(*pairs):
+    return ChatRequest(messages=[ChatMessage(role=role, content=content) for role, content in pairs])
+
+
+def test_system_prompts_are_deduplicated():
+    request = chat(("system", "Be brief."), ("system", "Be brief."), ("system", "Use INR."), ("user", "Hi"))
+    budgeted, stats = budget_chat_request(request)
+    assert [m.role for m in budgeted.messages] == ["system", "user"]
+    assert budgeted.messages[0].content == "Be brief.\n\nUse INR."
+    assert stats["turns_dropped"] == 0
+
+    persona, _ = budget_chat_request(chat(("user", "Hi")))
+    assert persona.messages[0].content == STYLIST_SYSTEM_PROMPT
+
+
+def test_max_turns_drops_oldest_and_tokens_saved(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_MAX_TURNS", 3)
+    request = chat(*[(("user", "assistant")[i % 2], f"turn {i}") for i in range(6)])
+    budgeted, stats = budget_chat_request(request)
+    assert [m.content for m in budgeted.messages[1:]] == ["turn 3", "turn 4", "turn 5"]
+    assert stats["turns_dropped"] == 3
+    assert budgeted.messages[0].content.endswith(NOTE + "turn 0; turn 2")
+
+    original = message_tokens("system", STYLIST_SYSTEM_PROMPT) + sum(message_tokens(m.role, m.content) for m in request.messages)
+    assert stats["prompt_tokens"] == sum(message_tokens(m.role, m.content) for m in budgeted.messages)
+    assert stats["tokens_saved"] == original - stats["prompt_tokens"]
+
+
+def test_latest_turn_is_kept_over_budget(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_PROMPT_TOKEN_BUDGET", 10)
+    request = chat(("user", "short"), ("user", "x" * 400))
+    budgeted, stats = budget_chat_request(request)
+    assert budgeted.messages[-1].content == "x" * 400
+    assert stats["turns_dropped"] == 1
+
+
+def test_summary_note_fits_in_the_budget(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_PROMPT_TOKEN_BUDGET", 400)
+    monkeypatch.setattr(server, "CHAT_SUMMARY_MAX_CHARS", 300)
+    request = chat(*[("user", f"Statement {i}: " + "I would like something elegant. " * 6) for i in range(12)])
+    budgeted, stats = budget_chat_request(request)
+    assert stats["turns_dropped"] > 0
+    assert NOTE in budgeted.messages[0].content
+    assert stats["prompt_tokens"] <= 400
+
+
+def test_summary_drops_whole_earlier_statements(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_MAX_TURNS", 1)
+    monkeypatch.setattr(server, "CHAT_SUMMARY_MAX_CHARS", 45)
+    request = chat(
+        ("user", "I love emerald earrings for weddings."),
+        ("user", "Budget is about two lakh."),
+        ("user", "Maybe rose gold."),
+        ("user", "Show me options"),
+    )
+    budgeted, _ = budget_chat_request(request)
+    assert budgeted.messages[0].content.endswith(NOTE + "Budget is about two lakh.; Maybe rose gold.")
+
+
+def test_summary_shortens_a_long_statement_at_a_boundary(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_MAX_TURNS", 1)
+    monkeypatch.setattr(server, "CHAT_SUMMARY_MAX_CHARS", 40)
+    sentences = chat(("user", "I need a necklace for my sister. She likes pearls and gold."), ("user", "ok"))
+    budgeted, _ = budget_chat_request(sentences)
+    assert budgeted.messages[0].content.endswith(NOTE + "I need a necklace for my sister.")
+
+    words = chat(("user", "something understated in white gold with small diamonds please"), ("user", "ok"))
+    budgeted, _ = budget_chat_request(words)
+    assert budgeted.messages[0].content.endswith(NOTE + "something understated in white gold…")
@@ -0,0 +1,22 @@
+"""
+Checks If-None-Match matching against the per-encoding ETags CompressionMiddleware sends.
+"""
+
+from server import encoded_etag, etag_matches
+
+TAG = '"16df4c2dc9b7c802"'
+
+
+def test_encoded_etag_adds_suffix_inside_quotes():
+    assert encoded_etag(TAG, "br") == '"16df4c2dc9b7c802-br"'
+    assert encoded_etag(TAG, "gzip") == '"16df4c2dc9b7c802-gzip"'
+
+
+def test_etag_matches_identity_weak_and_encoded_forms():
+    assert etag_matches(TAG, TAG)
+    assert etag_matches(f"W/{TAG}", TAG)
+    assert etag_matches(encoded_etag(TAG, "br"), TAG)
+    assert etag_matches(f'"other", W/{encoded_etag(TAG, "gzip")}', TAG)
+    assert etag_matches("*", TAG)
+    assert not etag_matches('"16df4c2dc9b7c803-br"', TAG)
+    assert not etag_matches(None, TAG)
@@ -0,0 +1,142 @@
+"""
+Checks the hedged fetch_ai_vibe scheduler with a fake OpenAI client whose models answer after set delays.
+"""
+
+import asyncio
+import json
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import AIRequest
+
+PAYLOAD = AIRequest(occasion="Wedding", style="Glam", budget="₹65,000+")
+HEDGE_DELAY = 0.05
+
+
+class FakeClient:
+    """chat.completions.create answers per model after a delay and records starts and cancellations."""
+
+    def __init__(self, delays, vibes=None, raw=None):
+        self.delays = delays
+        self.vibes = vibes or {}
+        self.raw = raw or {}
+        self.started = {}
+        self.cancelled = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, **kwargs):
+        loop = asyncio.get_running_loop()
+        self.started[model] = loop.time()
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        content = self.raw.get(model) or json.dumps({"vibe": self.vibes.get(model, "Hollywood Glam"), "explanation": f"from {model}"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def use_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o-mini")
+    monkeypatch.setattr(server, "VIBE_HEDGE", True)
+    monkeypatch.setattr(server, "VIBE_HEDGE_DELAY", HEDGE_DELAY)
+    monkeypatch.setattr(server, "VIBE_DEADLINE", 1.0)
+    monkeypatch.setattr(server, "vibe_latencies", deque(maxlen=200))
+
+    def install(client):
+        monkeypatch.setattr(server, "get_llm_client", lambda provider: client)
+        return client
+
+    return install
+
+
+async def fetch_and_settle():
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await server.fetch_ai_vibe(PAYLOAD)
+    elapsed = loop.time() - started
+    # Cancelled losers release their slots once they get to run
+    await asyncio.sleep(0.01)
+    return result, elapsed, started
+
+
+def assert_slots_released():
+    assert server.llm_provider_limiters["openai"].in_flight == 0
+    assert server.llm_global_limiter.in_flight == 0
+
+
+def test_fast_model_is_not_hedged(use_client):
+    client = use_client(FakeClient({"gpt-4o-mini": 0.01, "gpt-4o": 0.01, "gpt-4.1": 0.01}))
+    result, _, _ = asyncio.run(fetch_and_settle())
+    assert result.explanation == "from gpt-4o-mini"
+    assert list(client.started) == ["gpt-4o-mini"]
+    assert_slots_released()
+
+
+def test_hedge_starts_after_delay_and_loser_is_cancelled(use_client):
+    client = use_client(FakeClient({"gpt-4o-mini": 0.5, "gpt-4o": 0.02, "gpt-4.1": 0.02}))
+    result, elapsed, started = asyncio.run(fetch_and_settle())
+    assert result.explanation == "from gpt-4o"
+    assert list(client.started) == ["gpt-4o-mini", "gpt-4o"]
+    assert client.started["gpt-4o"] - started >= HEDGE_DELAY
+    assert elapsed < 0.5
+    assert client.cancelled == ["gpt-4o-mini"]
+    # The cancelled loser still counts toward the hedge delay, at its elapsed time
+    assert len(server.vibe_latencies) == 2
+    assert max(server.vibe_latencies) >= HEDGE_DELAY
+    assert_slots_released()
+
+
+def test_invalid_answer_does_not_win(use_client):
+    client = use_client(
+        FakeClient({"gpt-4o-mini": 0.01, "gpt-4o": 0.02, "gpt-4.1": 0.02}, vibes={"gpt-4o-mini": "Space Cowboy"})
+    )
+    result, elapsed, _ = asyncio.run(fetch_and_settle())
+    # The rejected answer replaces its model right away instead of waiting out the hedge delay
+    assert result.explanation == "from gpt-4o"
+    assert elapsed < HEDGE_DELAY + 0.02
+    assert_slots_released()
+
+
+def test_unreadable_answer_does_not_win(use_client):
+    use_client(FakeClient({"gpt-4o-mini": 0.01, "gpt-4o": 0.02, "gpt-4.1": 0.02}, raw={"gpt-4o-mini": "Hollywood Glam, surely"}))
+    result, _, _ = asyncio.run(fetch_and_settle())
+    assert result.explanation == "from gpt-4o"
+    assert_slots_released()
+
+
+def test_returns_none_at_deadline(use_client, monkeypatch):
+    monkeypatch.setattr(server, "VIBE_DEADLINE", 0.2)
+    client = use_client(FakeClient({"gpt-4o-mini": 5, "gpt-4o": 5, "gpt-4.1": 5}))
+    result, elapsed, _ = asyncio.run(fetch_and_settle())
+    assert result is None
+    assert 0.2 <= elapsed < 0.4
+    assert sorted(client.cancelled) == sorted(client.started) == ["gpt-4.1", "gpt-4o", "gpt-4o-mini"]
+    assert_slots_released()
+
+
+def test_get_ai_vibe_reports_answering_tier(use_client, monkeypatch):
+    use_client(FakeClient({"gpt-4o-mini": 0.01, "gpt-4o": 0.01, "gpt-4.1": 0.01}))
+    monkeypatch.setattr(server, "VIBE_CACHE_SHARED", False)
+    monkeypatch.setattr(server, "vibe_table", {})
+    monkeypatch.setattr(server, "vibe_cache", server.TTLCache(16, 60))
+
+    async def run():
+        live, tier = await server.get_ai_vibe(PAYLOAD)
+        assert tier == "llm" and live.explanation == "from gpt-4o-mini"
+        assert (await server.get_ai_vibe(PAYLOAD)) == (live, "local")
+        server.vibe_table[server.vibe_cache_key(PAYLOAD)] = live
+        assert (await server.get_ai_vibe(PAYLOAD)) == (live, "table")
+
+    asyncio.run(run())
+
+
+def test_unhedged_call_waits_for_the_slow_model(use_client):
+    client = use_client(FakeClient({"gpt-4o-mini": 0.15, "gpt-4o": 0.01, "gpt-4.1": 0.01}))
+    result = asyncio.run(server.fetch_ai_vibe(PAYLOAD, hedge=False))
+    assert result.explanation == "from gpt-4o-mini"
+    assert list(client.started) == ["gpt-4o-mini"]
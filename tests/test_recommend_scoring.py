@@ -0,0 +1,110 @@
+"""
+Checks the vectorized recommend_products scorer against the original per-item loop.
+"""
+
+import asyncio
+import random
+
+import server
+from server import BUDGET_RANGES_INR, USD_TO_INR, VIBE_IMAGES, CompiledCatalog, SurveyInput, top_k_positions
+
+STYLE_TAGS = ["Classic", "Modern", "Vintage", "Bohemian", "bold", "glam", "minimal", "romance", "luxe", "sculptural"]
+OCCASION_TAGS = ["Special Events", "Romantic", "Everyday", "wedding", "red carpet", "date night", "party", "office"]
+STYLES = ["Classic", "Modern", "Vintage Bohemian", "bold glam", "minimal", "Romance"]
+OCCASIONS = ["Special Events", "Everyday", "Romantic date night", "wedding", "Party", "red carpet event"]
+
+
+def legacy_top(items, s, vibe, min_inr, max_inr, k=4):
+    """The scoring loop recommend_products used before it was vectorized."""
+    style_q = s.style.lower().split()
+    occ_q = s.occasion.lower().split()
+    scored = []
+    for pos, it in enumerate(items):
+        price_usd = float(it.get("price", 0))
+        price_inr = price_usd * USD_TO_INR
+        if not (min_inr <= price_inr <= max_inr):
+            continue
+        score = 0.0
+        tags = [t.lower() for t in it.get("style_tags", [])]
+        occs = [t.lower() for t in it.get("occasion_tags", [])]
+        score += sum(1 for t in tags for q in style_q if q in t) * 1.5
+        score += sum(1 for t in occs for q in occ_q if q in t) * 1.2
+        if vibe.split()[0].lower() in tags:
+            score += 1.0
+        score += 0.2 if 8000 <= price_inr <= 65000 else 0
+        scored.append((score, pos))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:k]
+
+
+def random_catalog(rng, n):
+    items = []
+    for i in range(n):
+        items.append({
+            "id": f"p{i}",
+            "name": f"Product {i}",
+            "price": round(rng.uniform(0, 6000), 2),
+            "image_url": "",
+            # duplicates are allowed and must be counted twice
+            "style_tags": [rng.choice(STYLE_TAGS) for _ in range(rng.randint(0, 4))],
+            "occasion_tags": [rng.choice(OCCASION_TAGS) for _ in range(rng.randint(0, 3))],
+        })
+    return items
+
+
+def test_vectorized_scores_match_legacy_loop():
+    rng = random.Random(1234)
+    for n in (0, 1, 5, 40, 300):
+        items = random_catalog(rng, n)
+        compiled = CompiledCatalog(items)
+        for _ in range(60):
+            s = SurveyInput(occasion=rng.choice(OCCASIONS), style=rng.choice(STYLES), budget=rng.choice(list(BUDGET_RANGES_INR)))
+            vibe = rng.choice(list(VIBE_IMAGES))
+            min_inr, max_inr = BUDGET_RANGES_INR[s.budget]
+            score, in_budget = compiled.score(s, vibe, min_inr, max_inr)
+            expected = legacy_top(items, s, vibe, min_inr, max_inr)
+            assert top_k_positions(score, in_budget, 4) == [pos for _, pos in expected]
+            assert [score[pos] for _, pos in expected] == [sc for sc, _ in expected]
+
+
+def test_ties_keep_catalog_order():
+    items = [{"id": str(i), "price": 100.0, "style_tags": ["classic"], "occasion_tags": []} for i in range(10)]
+    compiled = CompiledCatalog(items)
+    s = SurveyInput(occasion="Everyday", style="Classic", budget="₹8,000–₹25,000")
+    score, in_budget = compiled.score(s, "Everyday Chic", 8000, 25000)
+    assert top_k_positions(score, in_budget, 4) == [0, 1, 2, 3]
+
+
+def test_snapshot_compiles_catalog():
+    snapshot = server.CatalogSnapshot(1, random_catalog(random.Random(7), 12))
+    assert snapshot.compiled.price_inr.shape == (12,)
+
+
+def legacy_fill(items, recs_ids, min_inr, max_inr):
+    """The budget fill-in loop recommend_products used before the seen-id set."""
+    ids = list(recs_ids)
+    for it in items:
+        price_inr = int(round(float(it.get("price", 0)) * USD_TO_INR))
+        if min_inr <= price_inr <= max_inr and all(i != it["id"] for i in ids):
+            ids.append(it["id"])
+        if len(ids) >= 4:
+            break
+    return ids
+
+
+def test_budget_fill_matches_legacy_loop(monkeypatch):
+    rng = random.Random(99)
+    items = random_catalog(rng, 200)
+    # Keep ensure_catalog from asking Mongo for the shared catalog version
+    monkeypatch.setattr(server, "CATALOG_VERSION_CHECK", float("inf"))
+    server._catalog = server.CatalogSnapshot(1, items)
+    try:
+        for budget in BUDGET_RANGES_INR:
+            s = SurveyInput(occasion="Everyday", style="Classic", budget=budget)
+            min_inr, max_inr = BUDGET_RANGES_INR[budget]
+            recs = asyncio.run(server.recommend_products(s, "Everyday Chic"))
+            top_ids = [items[pos]["id"] for _, pos in legacy_top(items, s, "Everyday Chic", min_inr, max_inr)]
+            expected = legacy_fill(items, top_ids, min_inr, max_inr) if len(top_ids) < 3 else top_ids
+            assert [r.product.id for r in recs] == expected
+    finally:
+        server._catalog = server.CatalogSnapshot(0, [])
@@ -0,0 +1,171 @@
+"""
+Checks SessionWriter batching, duplicate handling and shutdown drain against an in-memory collection.
+"""
+
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, DocumentTooLarge
+
+import server
+from server import SessionWriter
+
+
+class FakeCollection:
+    """Records insert_many batches; optional hooks fail or stall a write."""
+
+    def __init__(self):
+        self.docs = {}
+        self.batches = []
+        self.fail_with = []
+        self.gate = None
+        self.reject_ids = set()
+        self.started = asyncio.Event()
+
+    async def insert_many(self, docs, ordered=True):
+        self.started.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail_with:
+            raise self.fail_with.pop(0)
+        self.batches.append([d["id"] for d in docs])
+        for d in docs:
+            self.docs[d["id"]] = d
+
+    async def insert_one(self, doc):
+        if doc["id"] in self.reject_ids:
+            raise DocumentTooLarge(f"{doc['id']} is too large")
+        self.docs[doc["id"]] = doc
+
+
+class FakeDB:
+    def __init__(self):
+        self.sessions = FakeCollection()
+
+    def __getitem__(self, name):
+        assert name == "sessions"
+        return self.sessions
+
+
+def duplicate_error():
+    return BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]})
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(server, "db", fake)
+    monkeypatch.setattr(server, "SESSION_FLUSH_RETRY_DELAY", 0.01)
+    return fake
+
+
+def docs(n, start=0):
+    return [{"id": f"s{i}", "n": i} for i in range(start, start + n)]
+
+
+def test_flushes_when_batch_is_full(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=3, interval=60)
+        writer.start()
+        for d in docs(3):
+            await writer.submit(d)
+        assert writer.get("s0") is not None
+        for _ in range(50):
+            if writer.batches:
+                break
+            await asyncio.sleep(0.01)
+        assert fake_db.sessions.batches == [["s0", "s1", "s2"]]
+        assert writer.get("s0") is None
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_flushes_partial_batch_when_interval_expires(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=50, interval=0.05)
+        writer.start()
+        for d in docs(2):
+            await writer.submit(d)
+        await asyncio.sleep(0.01)
+        assert fake_db.sessions.batches == []
+        await asyncio.sleep(0.1)
+        assert fake_db.sessions.batches == [["s0", "s1"]]
+        assert writer.stats()["buffered"] == 0
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_duplicate_key_errors_count_as_stored(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=2, interval=60)
+        fake_db.sessions.fail_with = [duplicate_error()]
+        await writer._write(docs(2))
+        assert writer.pending == {}
+        assert writer.flushed == 2
+
+    asyncio.run(run())
+
+
+def test_rejected_documents_are_dropped_not_retried(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=2, interval=60)
+        fake_db.sessions.fail_with = [BulkWriteError({"writeErrors": [
+            {"index": 0, "code": 11000, "errmsg": "dup"},
+            {"index": 1, "code": 121, "errmsg": "validation"},
+        ]})]
+        assert await writer._store(docs(2), attempts=5)
+        assert writer.pending == {}
+        assert (writer.flushed, writer.dropped, writer.errors) == (1, 1, 0)
+
+        # A batch the client cannot send at all is written one document at a time
+        fake_db.sessions.fail_with = [DocumentTooLarge("too large")]
+        fake_db.sessions.reject_ids = {"s3"}
+        batch = docs(3, start=2)
+        for d in batch:
+            writer.pending[d["id"]] = d
+        assert await writer._store(batch, attempts=5)
+        assert set(fake_db.sessions.docs) >= {"s2", "s4"} and "s3" not in fake_db.sessions.docs
+        assert writer.pending == {}
+        assert (writer.flushed, writer.dropped, writer.errors) == (3, 2, 1)
+
+    asyncio.run(run())
+
+
+def test_transient_errors_are_retried_up_to_the_cap(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=2, interval=60)
+        fake_db.sessions.fail_with = [AutoReconnect("primary stepped down")]
+        assert await writer._store(docs(2), attempts=3)
+        assert fake_db.sessions.batches == [["s0", "s1"]]
+        assert (writer.flushed, writer.errors) == (2, 1)
+
+        fake_db.sessions.fail_with = [AutoReconnect("down")] * 3
+        batch = docs(2, start=2)
+        for d in batch:
+            writer.pending[d["id"]] = d
+        assert not await writer._store(batch, attempts=3)
+        assert writer.pending == {}
+        assert (writer.flushed, writer.dropped, writer.errors) == (2, 2, 4)
+
+    asyncio.run(run())
+
+
+def test_close_drains_batch_that_is_mid_write(fake_db):
+    async def run():
+        writer = SessionWriter("sessions", max_queue=100, batch_size=2, interval=60)
+        fake_db.sessions.gate = asyncio.Event()
+        writer.start()
+        for d in docs(3):
+            await writer.submit(d)
+        await fake_db.sessions.started.wait()
+        # The flusher holds s0, s1 in a stalled insert; s2 is still queued
+        fake_db.sessions.gate.set()
+        close = asyncio.create_task(writer.close())
+        await close
+        assert set(fake_db.sessions.docs) == {"s0", "s1", "s2"}
+        assert writer.pending == {}
+        assert writer.queue.empty()
+
+    asyncio.run(run())